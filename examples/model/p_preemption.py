@@ -22,7 +22,7 @@ class PriorityPreemption(simpype.Pipe):
 		if message.property['priority'].value == 'urgent':
 			m = self.queue['urgent'].push(message)
 			
-			tlist = [t for t in self.resource.task.values() if t.process.is_alive and t.message.property['priority'].value != 'urgent']
+			tlist = [t for t in self.resource.task.values() if t.is_alive and t.message.property['priority'].value != 'urgent']
 			# If the resource is busy, preempt the current task
 			if len(tlist) > 0:
 				#task = max(tlist, key = lambda task: task.message.property['priority'].value)
@@ -58,8 +58,8 @@ class TokenBucket(simpype.Queue):
 		else:
 			return None
 
-	def __len__(self):
-		return sum([m.property['size'].value for m in self.buffer])
+	def size(self, message):
+		return message.property['size'].value
 
 
 class Wfq(simpype.Pipe):
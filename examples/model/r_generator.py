@@ -5,6 +5,7 @@ class Generator(simpype.Resource):
 	def __init__(self, sim, id):
 		super().__init__(sim, id)
 		self.message = simpype.Message(self.sim, self, self.id)
+		self.template = simpype.message.Template(self.message)
 		self.counter = 0
 		self.to_send = float("inf")
 		# Init
@@ -13,13 +14,13 @@ class Generator(simpype.Resource):
 		self.a_gen = self.env.process(self.h_gen())
 
 	def gen_message(self):
-		message = self.message.copy()
+		if self.template.message is not self.message:
+			self.template = simpype.message.Template(self.message)
+		message = self.template.generate()
 		message.seq_num = self.counter
 		message.generated = self.env.now
-		for p in message.property.values():
-			p.refresh()
-		if 'lifetime' in message.property:
-			message.drop('lifetime', self.env.timeout(message.property['lifetime'].value, 'expired'))
+		if message._property and 'lifetime' in message._property:
+			message.drop('lifetime', self.sim.timer.timeout(message._property['lifetime'].value, 'expired'))
 		message.is_alive = True
 		return message
 
@@ -51,4 +51,8 @@ setup(
     keywords='simulation queue pipe simpy',
 	packages=['simpype', 'simpype.model'],
     install_requires=['simpy>=4.0.1'],
+    # Optional dependencies, e.g. pip install simpype[numpy]
+    extras_require={
+        'numpy': ['numpy'],
+    },
 )
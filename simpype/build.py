@@ -4,6 +4,7 @@ SimPype's build library.
 """
 
 import importlib
+import importlib.util
 import logging
 import os
 
@@ -25,6 +26,29 @@ def _import(model, prefix):
 	module = importlib.machinery.SourceFileLoader(model, os.path.join(prefix, model+'.py')).load_module()
 	return module
 
+def _model(sim, model, default):
+	""" Import the python module of a model.
+
+	A custom model is looked up in the model directory of the simulation first,
+	then among the models shipped with SimPype in :mod:`simpype.model`.
+
+	Args:
+		sim (:class:`~simpype.simulation.Simulation`):
+			The SimPype simulation object
+		model (str):
+			The name of the model, ``None`` for the default model
+		default (str):
+			The name of the default model
+
+	Returns:
+		user-defined python module
+	"""
+	if model is None:
+		return importlib.import_module('simpype.model.'+default)
+	if not os.path.isfile(os.path.join(sim.model.dir, model+'.py')) and importlib.util.find_spec('simpype.model.'+model) is not None:
+		return importlib.import_module('simpype.model.'+model)
+	return _import(model, sim.model.dir)
+
 def logger(name, path):
 	""" Create a logger object.
 
@@ -74,10 +98,7 @@ def resource(sim, id, model = None, capacity = 1, pipe = None):
 	Returns:
 		:class:`~simpype.resource.Resource`
 	"""
-	if model is None:
-		module = importlib.import_module('simpype.model.resource')
-	else:
-		module = _import(model, sim.model.dir)
+	module = _model(sim, model, 'resource')
 	return module.resource(sim, id, capacity, pipe)
 
 def generator(sim, id, model = None):
@@ -97,10 +118,7 @@ def generator(sim, id, model = None):
 	Returns:
 		:class:`~simpype.resource.Resource`
 	"""
-	if model is None:
-		module = importlib.import_module('simpype.model.generator')
-	else:
-		module = _import(model, sim.model.dir)
+	module = _model(sim, model, 'generator')
 	return module.resource(sim, id)
 
 def pipe(sim, resource, id, model = None):
@@ -122,10 +140,7 @@ def pipe(sim, resource, id, model = None):
 	Returns:
 		:class:`~simpype.pipe.Pipe`
 	"""
-	if model is None:
-		module = importlib.import_module('simpype.model.pipe')
-	else:
-		module = _import(model, sim.model.dir)
+	module = _model(sim, model, 'pipe')
 	return module.pipe(sim, resource, id)
 
 def queue(sim, pipe, id, model = None):
@@ -147,8 +162,5 @@ def queue(sim, pipe, id, model = None):
 	Returns:
 		:class:`~simpype.queue.Queue`
 	"""
-	if model is None:
-		module = importlib.import_module('simpype.model.queue')
-	else:
-		module = _import(model, sim.model.dir)
+	module = _model(sim, model, 'queue')
 	return module.queue(sim, pipe, id)
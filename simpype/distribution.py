@@ -0,0 +1,636 @@
+"""
+SimPype's distributions.
+
+A distribution is a callable returning random values, which can be used in place of a ``lambda`` function
+in the step dictionary of a :class:`~simpype.random.Random` variable, or in place of the whole step dictionary
+of a :class:`~simpype.random.RandomDict` key or of a message property.
+Unlike a ``lambda`` function, a distribution can be pickled and exposes its mean and variance.
+Values are sampled in blocks through NumPy, if available, and handed out one at a time,
+so that drawing a value does not call any Python function.
+Without NumPy, the blocks are sampled through the python ``random`` module, one value at a time.
+The cost of :attr:`~simpype.random.Random.value` is dominated by the interpreter, though:
+with NumPy, a value of a distribution costs 0.5 to 0.7 times as much as a value of a ``lambda`` calling the ``random`` module,
+and slightly more without NumPy (see ``tests/benchmark.py``).
+
+.. code-block :: python
+
+	import simpype
+	from simpype.distribution import Exponential, Uniform
+
+	sim = simpype.Simulation(id = 'simple')
+	gen0 = sim.add_generator(id = 'gen0')
+	gen0.random['arrival'] = {
+		0	: Exponential(1.0 / 60.0),
+		3600	: Uniform(50.0, 70.0),
+	}
+	gen0.message.property['fish'] = Choice(['cod', 'tuna', 'calamari'], [0.5, 0.3, 0.2])
+
+A distribution used by a :class:`~simpype.random.Random` variable draws its blocks from the
+:class:`~simpype.random.Stream` of the variable, if any, so that its values only depend on the simulation seed
+(see :attr:`~simpype.simulation.Simulation.seed`) and on the component it belongs to.
+Otherwise, the generator of the blocks is seeded from the python ``random`` module.
+
+If the stream is antithetic (see :attr:`~simpype.simulation.Simulation.antithetic`), each value ``x``
+is replaced by ``ppf(1 - cdf(x))``, i.e. the value at the opposite quantile.
+The discrete distributions, sampled by inversion, use the opposite uniform value instead.
+:class:`Gamma` and :class:`Categorical` do not support antithetic streams, and raise a ValueError when bound to one.
+
+"""
+
+import itertools
+import math
+import random
+import sys
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+# The default number of values sampled at once, about 128 kB of python floats per distribution
+BLOCK = 4096
+
+
+def _open(u):
+	""" Map a uniform value in [0, 1] to (0, 1) """
+	return min(max(u, 2.0 ** -1074), 1.0 - 2.0 ** -53)
+
+
+# The coefficients of the rational approximations of Wichura's algorithm AS241,
+# from the highest degree to the lowest, for the numerator and the denominator
+_AS241 = (
+	(
+		(2509.0809287301226727, 33430.575583588128105, 67265.770927008700853, 45921.953931549871457,
+		13731.693765509461125, 1971.5909503065514427, 133.14166789178437745, 3.387132872796366608),
+		(5226.495278852854561, 28729.085735721942674, 39307.89580009271061, 21213.794301586595867,
+		5394.1960214247511077, 687.1870074920579083, 42.313330701600911252, 1.0),
+	),
+	(
+		(7.7454501427834140764e-4, 0.0227238449892691845833, 0.24178072517745061177, 1.27045825245236838258,
+		3.64784832476320460504, 5.7694972214606914055, 4.6303378461565452959, 1.42343711074968357734),
+		(1.05075007164441684324e-9, 5.475938084995344946e-4, 0.0151986665636164571966, 0.14810397642748007459,
+		0.68976733498510000455, 1.6763848301838038494, 2.05319162663775882187, 1.0),
+	),
+	(
+		(2.01033439929228813265e-7, 2.71155556874348757815e-5, 0.0012426609473880784386, 0.026532189526576123093,
+		0.29656057182850489123, 1.7848265399172913358, 5.4637849111641143699, 6.6579046435011037772),
+		(2.04426310338993978564e-15, 1.4215117583164458887e-7, 1.8463183175100546818e-5, 7.868691311456132591e-4,
+		0.0148753612908506148525, 0.13692988092273580531, 0.59983220655588793769, 1.0),
+	),
+)
+
+
+def _polynomial(coefficients, x):
+	value = 0.0
+	for c in coefficients:
+		value = value * x + c
+	return value
+
+
+def _ppf(u):
+	""" The standard normal value at the quantile ``u`` in (0, 1), by Wichura's algorithm AS241 """
+	q = u - 0.5
+	if abs(q) <= 0.425:
+		r = 0.180625 - q * q
+		num, den = _AS241[0]
+		return _polynomial(num, r) * q / _polynomial(den, r)
+	r = math.sqrt(-math.log(u if q <= 0.0 else 1.0 - u))
+	if r <= 5.0:
+		r = r - 1.6
+		num, den = _AS241[1]
+	else:
+		r = r - 5.0
+		num, den = _AS241[2]
+	x = _polynomial(num, r) / _polynomial(den, r)
+	return -x if q < 0.0 else x
+
+
+class Distribution:
+	""" The base class of the distributions sampled in blocks.
+
+	Subclasses implement ``_numpy`` and ``_stdlib``, sampling ``n`` values
+	from a numpy.random.Generator and from a random.Random object respectively,
+	and the ``mean`` and ``variance`` properties.
+	Subclasses may also implement ``_antithetic``, mapping the NumPy array of the values sampled by ``_numpy``
+	to the values at the opposite quantiles, for antithetic streams.
+	A pickled distribution keeps its parameters only: the values sampled in advance,
+	the generator and the stream are discarded.
+
+	Args:
+		block (int, optional):
+			The number of values sampled at once
+
+	Attributes:
+		block (int):
+			The number of values sampled at once
+		draw (callable):
+			The function returning the next value, without arguments
+		stream (:class:`~simpype.random.Stream`):
+			The stream the blocks are sampled from, if any
+
+	"""
+	def __init__(self, block = BLOCK):
+		assert isinstance(block, int) and block > 0
+		self.block = block
+		self.stream = None
+		self._rng = None
+		self._values = self._iterator()
+		self.draw = self._values.__next__
+
+	def __call__(self):
+		return self.draw()
+
+	def __getstate__(self):
+		state = self.__dict__.copy()
+		# Iterators, generators and streams cannot be pickled
+		del state['draw']
+		del state['_values']
+		state['stream'] = None
+		state['_rng'] = None
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self._values = self._iterator()
+		self.draw = self._values.__next__
+
+	def __repr__(self):
+		parameters = ', '.join('%s=%r' % (k, v) for k, v in self.__dict__.items() if k not in ('block', 'stream', 'draw') and not k.startswith('_'))
+		return '%s(%s)' % (type(self).__name__, parameters)
+
+	@property
+	def mean(self):
+		""" The mean of the distribution. """
+		raise NotImplementedError
+
+	@property
+	def variance(self):
+		""" The variance of the distribution. """
+		raise NotImplementedError
+
+	def sample(self, n):
+		""" Sample ``n`` values at once, without consuming the values sampled in advance.
+
+		Args:
+			n (int):
+				The number of values
+
+		Returns:
+			list
+
+		"""
+		assert isinstance(n, int) and n >= 0
+		return self._sample(n)
+
+	def _iterator(self):
+		# The C-level iterator over the blocks avoids any Python call per value
+		return itertools.chain.from_iterable(self._blocks())
+
+	def _blocks(self):
+		while True:
+			yield self._sample(self.block)
+
+	def _sample(self, n):
+		""" Sample a block of ``n`` values as a list of python numbers """
+		if self.stream is not None:
+			if self.stream.antithetic and not self._antithetic_variates:
+				self._check()
+			if numpy is not None:
+				values = self._numpy(self.stream.numpy, n)
+				if self.stream.antithetic and not self._inversion:
+					values = self._antithetic(values)
+				return values.tolist()
+			# The python generator of an antithetic stream already returns the opposite uniform values
+			return self._stdlib(self.stream.random, n)
+		if self._rng is None:
+			seed = random.getrandbits(64)
+			self._rng = numpy.random.default_rng(seed) if numpy is not None else random.Random(seed)
+		if numpy is not None:
+			return self._numpy(self._rng, n).tolist()
+		return self._stdlib(self._rng, n)
+
+	# True if ``_numpy`` samples by inversion of uniform values drawn through ``_uniform``
+	_inversion = False
+	# False if the distribution cannot return antithetic variates, neither with NumPy nor without
+	_antithetic_variates = True
+
+	def _check(self):
+		""" Raise a ValueError if the stream is antithetic and the distribution does not support it """
+		if self.stream is not None and self.stream.antithetic and not self._antithetic_variates:
+			raise ValueError("%s does not support antithetic streams" % type(self).__name__)
+
+	def _numpy(self, rng, n):
+		raise NotImplementedError
+
+	def _stdlib(self, rng, n):
+		raise NotImplementedError
+
+	def _antithetic(self, values):
+		raise NotImplementedError("%s does not support antithetic streams" % type(self).__name__)
+
+	def _uniform(self, rng, n):
+		""" Sample ``n`` uniform values in [0, 1), replaced by their complement in an antithetic stream """
+		u = rng.random(n)
+		if self.stream is not None and self.stream.antithetic:
+			u = 1.0 - u
+		return u
+
+
+class Constant(Distribution):
+	""" The constant distribution.
+
+	Args:
+		value (any):
+			The returned value
+
+	"""
+	def __init__(self, value):
+		self.value = value
+		super().__init__(1)
+
+	@property
+	def mean(self):
+		return self.value
+
+	@property
+	def variance(self):
+		return 0
+
+	def _iterator(self):
+		return itertools.repeat(self.value)
+
+	def _sample(self, n):
+		return [self.value] * n
+
+
+class Exponential(Distribution):
+	""" The exponential distribution, as ``random.expovariate``.
+
+	Args:
+		rate (float):
+			The rate, that is 1.0 divided by the mean
+		block (int, optional):
+			The number of values sampled at once
+
+	"""
+	def __init__(self, rate, block = BLOCK):
+		assert rate > 0
+		self.rate = rate
+		super().__init__(block)
+
+	@property
+	def mean(self):
+		return 1.0 / self.rate
+
+	@property
+	def variance(self):
+		return 1.0 / self.rate ** 2
+
+	def _numpy(self, rng, n):
+		return rng.exponential(1.0 / self.rate, n)
+
+	def _antithetic(self, values):
+		return -numpy.log(-numpy.expm1(-self.rate * values)) / self.rate
+
+	def _stdlib(self, rng, n):
+		return [rng.expovariate(self.rate) for i in range(n)]
+
+
+class Uniform(Distribution):
+	""" The uniform distribution, as ``random.uniform``.
+
+	Args:
+		a (float):
+			The lower bound
+		b (float):
+			The upper bound
+		block (int, optional):
+			The number of values sampled at once
+
+	"""
+	def __init__(self, a, b, block = BLOCK):
+		self.a = a
+		self.b = b
+		super().__init__(block)
+
+	@property
+	def mean(self):
+		return (self.a + self.b) / 2.0
+
+	@property
+	def variance(self):
+		return (self.b - self.a) ** 2 / 12.0
+
+	def _numpy(self, rng, n):
+		return rng.uniform(self.a, self.b, n)
+
+	def _antithetic(self, values):
+		return self.a + self.b - values
+
+	def _stdlib(self, rng, n):
+		return [rng.uniform(self.a, self.b) for i in range(n)]
+
+
+class Normal(Distribution):
+	""" The normal distribution, as ``random.gauss``.
+
+	Args:
+		mu (float):
+			The mean
+		sigma (float):
+			The standard deviation
+		block (int, optional):
+			The number of values sampled at once
+
+	"""
+	def __init__(self, mu, sigma, block = BLOCK):
+		assert sigma >= 0
+		self.mu = mu
+		self.sigma = sigma
+		super().__init__(block)
+
+	@property
+	def mean(self):
+		return self.mu
+
+	@property
+	def variance(self):
+		return self.sigma ** 2
+
+	def _numpy(self, rng, n):
+		return rng.normal(self.mu, self.sigma, n)
+
+	def _antithetic(self, values):
+		return 2.0 * self.mu - values
+
+	def _stdlib(self, rng, n):
+		# By inversion, so that antithetic streams return antithetic variates
+		if self.sigma == 0:
+			return [float(self.mu)] * n
+		mu, sigma = self.mu, self.sigma
+		return [mu + _ppf(_open(rng.random())) * sigma for i in range(n)]
+
+
+class LogNormal(Distribution):
+	""" The log-normal distribution, as ``random.lognormvariate``.
+
+	Args:
+		mu (float):
+			The mean of the underlying normal distribution
+		sigma (float):
+			The standard deviation of the underlying normal distribution
+		block (int, optional):
+			The number of values sampled at once
+
+	"""
+	def __init__(self, mu, sigma, block = BLOCK):
+		assert sigma >= 0
+		self.mu = mu
+		self.sigma = sigma
+		super().__init__(block)
+
+	@property
+	def mean(self):
+		return math.exp(self.mu + self.sigma ** 2 / 2.0)
+
+	@property
+	def variance(self):
+		return math.expm1(self.sigma ** 2) * math.exp(2.0 * self.mu + self.sigma ** 2)
+
+	def _numpy(self, rng, n):
+		return rng.lognormal(self.mu, self.sigma, n)
+
+	def _antithetic(self, values):
+		return math.exp(2.0 * self.mu) / values
+
+	def _stdlib(self, rng, n):
+		return [math.exp(x) for x in Normal._stdlib(self, rng, n)]
+
+
+class Gamma(Distribution):
+	""" The gamma distribution, as ``random.gammavariate``.
+
+	Args:
+		alpha (float):
+			The shape
+		beta (float):
+			The scale
+		block (int, optional):
+			The number of values sampled at once
+
+	"""
+	def __init__(self, alpha, beta, block = BLOCK):
+		assert alpha > 0 and beta > 0
+		self.alpha = alpha
+		self.beta = beta
+		super().__init__(block)
+
+	@property
+	def mean(self):
+		return self.alpha * self.beta
+
+	@property
+	def variance(self):
+		return self.alpha * self.beta ** 2
+
+	_antithetic_variates = False
+
+	def _numpy(self, rng, n):
+		return rng.gamma(self.alpha, self.beta, n)
+
+	def _stdlib(self, rng, n):
+		return [rng.gammavariate(self.alpha, self.beta) for i in range(n)]
+
+
+class Weibull(Distribution):
+	""" The Weibull distribution, as ``random.weibullvariate``.
+
+	Args:
+		alpha (float):
+			The scale
+		beta (float):
+			The shape
+		block (int, optional):
+			The number of values sampled at once
+
+	"""
+	def __init__(self, alpha, beta, block = BLOCK):
+		assert alpha > 0 and beta > 0
+		self.alpha = alpha
+		self.beta = beta
+		super().__init__(block)
+
+	@property
+	def mean(self):
+		return self.alpha * math.gamma(1.0 + 1.0 / self.beta)
+
+	@property
+	def variance(self):
+		return self.alpha ** 2 * (math.gamma(1.0 + 2.0 / self.beta) - math.gamma(1.0 + 1.0 / self.beta) ** 2)
+
+	def _numpy(self, rng, n):
+		return self.alpha * rng.weibull(self.beta, n)
+
+	def _antithetic(self, values):
+		return self.alpha * (-numpy.log(-numpy.expm1(-(values / self.alpha) ** self.beta))) ** (1.0 / self.beta)
+
+	def _stdlib(self, rng, n):
+		return [rng.weibullvariate(self.alpha, self.beta) for i in range(n)]
+
+
+class Empirical(Distribution):
+	""" The empirical distribution, returning the observed values with equal probability.
+
+	Args:
+		samples (list):
+			The observed values
+		block (int, optional):
+			The number of values sampled at once
+
+	"""
+	def __init__(self, samples, block = BLOCK):
+		assert len(samples) > 0
+		self.samples = tuple(samples)
+		super().__init__(block)
+
+	@property
+	def mean(self):
+		return sum(self.samples) / len(self.samples)
+
+	@property
+	def variance(self):
+		mean = self.mean
+		return sum((v - mean) ** 2 for v in self.samples) / len(self.samples)
+
+	_inversion = True
+
+	def _numpy(self, rng, n):
+		k = len(self.samples)
+		index = numpy.minimum((self._uniform(rng, n) * k).astype(int), k - 1)
+		return numpy.asarray(self.samples, dtype = object)[index]
+
+	def _stdlib(self, rng, n):
+		return rng.choices(self.samples, k = n)
+
+
+class Choice(Distribution):
+	""" The discrete distribution over a set of items, as ``random.choices``.
+
+	Args:
+		items (list):
+			The items
+		weights (list, optional):
+			The relative weights of the items, equal by default
+		block (int, optional):
+			The number of values sampled at once
+
+	"""
+	def __init__(self, items, weights = None, block = BLOCK):
+		assert len(items) > 0
+		assert weights is None or (len(weights) == len(items) and min(weights) >= 0 and sum(weights) > 0)
+		self.items = tuple(items)
+		self.weights = tuple(weights) if weights is not None else None
+		super().__init__(block)
+
+	@property
+	def probabilities(self):
+		""" The probabilities of the items. """
+		if self.weights is None:
+			return tuple(1.0 / len(self.items) for i in self.items)
+		total = float(sum(self.weights))
+		return tuple(w / total for w in self.weights)
+
+	@property
+	def mean(self):
+		return sum(p * v for p, v in zip(self.probabilities, self.items))
+
+	@property
+	def variance(self):
+		mean = self.mean
+		return sum(p * (v - mean) ** 2 for p, v in zip(self.probabilities, self.items))
+
+	_inversion = True
+
+	def _numpy(self, rng, n):
+		cumulative = numpy.cumsum(self.probabilities)
+		index = numpy.minimum(numpy.searchsorted(cumulative, self._uniform(rng, n), side = 'right'), len(self.items) - 1)
+		return numpy.asarray(self.items, dtype = object)[index]
+
+	def _stdlib(self, rng, n):
+		return rng.choices(self.items, self.weights, k = n)
+
+
+class Categorical(Choice):
+	""" The discrete distribution over a set of categories, sampled with Walker's alias method.
+
+	Setting up the alias table takes a time linear in the number of categories, drawing a value takes a constant time.
+	The string categories are interned, and every value drawn is one of the objects in ``items``,
+	so that comparing, hashing and logging the values stays cheap.
+
+	Args:
+		items (list):
+			The categories
+		weights (list, optional):
+			The relative weights of the categories, equal by default
+		block (int, optional):
+			The number of values sampled at once
+
+	"""
+	def __init__(self, items, weights = None, block = BLOCK):
+		items = [sys.intern(i) if type(i) is str else i for i in items]
+		super().__init__(items, weights, block)
+		self._index = {v: i for i, v in enumerate(self.items)}
+		self._alias()
+
+	@property
+	def index(self):
+		""" The dictionary mapping each category to its position in ``items``, e.g. to route on integers. """
+		return self._index
+
+	def _alias(self):
+		""" Build the alias table with Vose's algorithm """
+		k = len(self.items)
+		scaled = [p * k for p in self.probabilities]
+		self._prob = [1.0] * k
+		self._alias_index = list(range(k))
+		small = [i for i, p in enumerate(scaled) if p < 1.0]
+		large = [i for i, p in enumerate(scaled) if p >= 1.0]
+		while small and large:
+			s = small.pop()
+			l = large.pop()
+			self._prob[s] = scaled[s]
+			self._alias_index[s] = l
+			scaled[l] -= 1.0 - scaled[s]
+			(small if scaled[l] < 1.0 else large).append(l)
+		# The leftovers have probability 1 up to rounding errors
+		if numpy is not None:
+			self._prob_array = numpy.asarray(self._prob)
+			self._alias_array = numpy.asarray(self._alias_index)
+
+	_inversion = False
+	_antithetic_variates = False
+
+	def _numpy(self, rng, n):
+		column = rng.integers(0, len(self.items), n)
+		alias = rng.random(n) >= self._prob_array[column]
+		column[alias] = self._alias_array[column[alias]]
+		return column
+
+	def _stdlib(self, rng, n):
+		k = len(self.items)
+		prob = self._prob
+		alias = self._alias_index
+		items = self.items
+		values = []
+		for i in range(n):
+			u = rng.random() * k
+			column = int(u)
+			values.append(items[column] if u - column < prob[column] else items[alias[column]])
+		return values
+
+	def _sample(self, n):
+		if numpy is not None:
+			# Sample the positions, then map them to the categories
+			return list(map(self.items.__getitem__, super()._sample(n)))
+		return super()._sample(n)
@@ -0,0 +1,348 @@
+"""
+SimPype's log files.
+
+The binary log stores the simulation events in columns: the timestamps, the message ids, the sequence numbers,
+the resource ids, the event descriptions, and the logged message properties.
+The columns are buffered in preallocated typed arrays and written to the log file a chunk of rows at a time,
+while the strings, e.g. the message ids, are interned and stored once as integer codes.
+
+.. code-block :: python
+
+	sim.log.format = 'binary'
+	sim.run(until = 60)
+
+	# Convert the binary log to the CSV format of sim.log
+	simpype.log.to_csv(os.path.join(sim.log.dir, 'sim.bin'), 'sim.log')
+
+The binary log file is made of:
+
+	* a header: the magic bytes ``SPLOG001``, the length of the JSON header as a little-endian uint32,
+	  and the JSON header storing the byte order, the column names, and the logged properties;
+	* a sequence of chunks: the number of rows and the length of the JSON list of the strings interned in the chunk,
+	  as little-endian uint32, the JSON list, and the columns of the chunk one after another.
+
+The strings interned by each chunk are appended to the string table, and the codes index the string table.
+Each property is stored in three columns: its kind (0 for a string, 1 for a float), its float value,
+and the code of its string value.
+
+Both the binary and the CSV log files can be written by a background :class:`Worker` thread,
+so that the disk writes overlap with the simulation:
+
+.. code-block :: python
+
+	sim.log.thread = True
+
+"""
+
+import array
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+
+MAGIC = b'SPLOG001'
+
+# The columns of a log entry and their array typecodes
+COLUMNS = (
+	('timestamp', 'd'),
+	('message', 'I'),
+	('seq_num', 'q'),
+	('resource', 'I'),
+	('event', 'I'),
+)
+PROPERTY = (
+	('kind', 'B'),
+	('number', 'd'),
+	('code', 'I'),
+)
+
+STRING = 0
+FLOAT = 1
+
+
+class Worker:
+	""" This class implements the background thread writing the log files.
+
+	The jobs are handed to the thread through a bounded queue: handing a job blocks while the queue is full,
+	so that the memory held by the pending jobs stays bounded.
+	An exception raised by a job is raised again by the next call to :meth:`put` or :meth:`close`.
+
+	Args:
+		size (int, optional):
+			The maximum number of pending jobs
+
+	"""
+	def __init__(self, size = 4):
+		assert size > 0
+		self._queue = queue.Queue(size)
+		self._error = None
+		self._thread = threading.Thread(target = self._run, name = 'simpype.log', daemon = True)
+		self._thread.start()
+
+	def _run(self):
+		while True:
+			job = self._queue.get()
+			if job is None:
+				return
+			# After an error, the pending jobs are discarded
+			if self._error is None:
+				try:
+					job[0](*job[1:])
+				except BaseException as e:
+					self._error = e
+
+	def _raise(self):
+		if self._error is not None:
+			error, self._error = self._error, None
+			raise error
+
+	def put(self, function, *args):
+		""" Hand a job to the thread, waiting while the queue is full.
+
+		Args:
+			function (python function):
+				The function to be called by the thread
+			*args:
+				The arguments of the function
+
+		"""
+		self._raise()
+		self._queue.put((function,) + args)
+
+	def close(self):
+		""" Wait for the pending jobs and stop the thread. """
+		self._queue.put(None)
+		self._thread.join()
+		self._raise()
+
+
+class Writer:
+	""" This class implements the writer of the binary log.
+
+	Args:
+		path (str):
+			The path of the binary log file
+		properties (list):
+			The names of the logged message properties
+		chunk (int, optional):
+			The number of rows written to the file at once
+		thread (:class:`Worker`, optional):
+			The thread writing the chunks to the file
+		sync (bool, optional):
+			Sync the file to the disk when closing it
+
+	Attributes:
+		path (str):
+			The path of the binary log file
+		properties (list):
+			The names of the logged message properties
+		chunk (int):
+			The number of rows written to the file at once
+		thread (:class:`Worker`):
+			The thread writing the chunks to the file, ``None`` to write them from the simulation
+		sync (bool):
+			Sync the file to the disk when closing it
+
+	"""
+	def __init__(self, path, properties, chunk = 65536, thread = None, sync = False):
+		assert chunk > 0
+		self.path = path
+		self.properties = list(properties)
+		self.chunk = chunk
+		self.thread = thread
+		self.sync = sync
+		self._strings = {}
+		self._new = []
+		self._rows = 0
+		# The buffers given back by the thread once written
+		self._spare = []
+		self._fixed, self._property = self._buffers()
+		self._file = open(path, 'wb')
+		header = json.dumps({
+			'byteorder': sys.byteorder,
+			'columns': [n for n, t in COLUMNS],
+			'properties': self.properties,
+		}).encode()
+		self._file.write(MAGIC + struct.pack('<I', len(header)) + header)
+
+	def _buffers(self):
+		""" A set of column buffers, preallocated: the rows are assigned in place """
+		if self._spare:
+			return self._spare.pop()
+		fixed = [array.array(t, bytes(array.array(t).itemsize * self.chunk)) for n, t in COLUMNS]
+		property = [
+			[array.array(t, bytes(array.array(t).itemsize * self.chunk)) for n, t in PROPERTY]
+			for p in self.properties
+		]
+		return fixed, property
+
+	def _intern(self, s):
+		""" The code of the string ``s`` """
+		code = self._strings.get(s)
+		if code is None:
+			code = self._strings[s] = len(self._strings)
+			self._new.append(s)
+		return code
+
+	def write(self, timestamp):
+		""" Buffer a log entry, writing the buffered chunk to the file once full.
+
+		Args:
+			timestamp (:class:`~simpype.message.Timestamp`):
+				The entry to be logged
+
+		"""
+		i = self._rows
+		message = timestamp.message
+		intern = self._intern
+		time, msg, seq_num, resource, event = self._fixed
+		time[i] = timestamp.timestamp
+		msg[i] = intern(message.id)
+		seq_num[i] = message.seq_num
+		resource[i] = intern(timestamp.resource.id)
+		event[i] = intern(timestamp.description)
+		if self.properties:
+			# Read only: the properties shared with a template are not copied
+			property = message._property or {}
+			for name, (kind, number, code) in zip(self.properties, self._property):
+				p = property.get(name)
+				value = p.value if p is not None else 'NA'
+				if type(value) is float:
+					kind[i] = FLOAT
+					number[i] = value
+				else:
+					kind[i] = STRING
+					code[i] = intern(str(value))
+		self._rows = i + 1
+		if self._rows == self.chunk:
+			self.flush()
+
+	def reopen(self):
+		""" Reopen the file closed by :meth:`close`, the following rows being appended. """
+		if self._file.closed:
+			self._file = open(self.path, 'ab')
+
+	def flush(self):
+		""" Write the buffered rows to the file, or hand them to the thread. """
+		# The rows logged after close(), e.g. between two runs, are appended
+		self.reopen()
+		rows = self._rows
+		if rows:
+			strings = json.dumps(self._new).encode()
+			head = struct.pack('<II', rows, len(strings)) + strings
+			self._new = []
+			self._rows = 0
+			if self.thread is None:
+				self._write(head, rows, self._fixed, self._property)
+			else:
+				self.thread.put(self._hand, head, rows, self._fixed, self._property)
+				self._fixed, self._property = self._buffers()
+		if self.thread is None:
+			self._file.flush()
+		else:
+			self.thread.put(self._file.flush)
+
+	def _write(self, head, rows, fixed, property):
+		f = self._file
+		f.write(head)
+		for column in fixed:
+			f.write(memoryview(column)[:rows])
+		for columns in property:
+			for column in columns:
+				f.write(memoryview(column)[:rows])
+
+	def _hand(self, head, rows, fixed, property):
+		""" Write a chunk from the thread, and give its buffers back """
+		self._write(head, rows, fixed, property)
+		self._spare.append((fixed, property))
+
+	def _close(self):
+		f = self._file
+		f.flush()
+		if self.sync:
+			os.fsync(f.fileno())
+		f.close()
+
+	def close(self):
+		""" Write the buffered rows and close the file, synced to the disk if :attr:`sync` is ``True``.
+
+		The file is reopened by :meth:`reopen` or by the next :meth:`flush`.
+
+		"""
+		self.flush()
+		if self.thread is not None:
+			self.thread.put(self._close)
+		else:
+			self._close()
+
+
+def read(path):
+	""" Read a binary log file.
+
+	Args:
+		path (str):
+			The path of the binary log file
+
+	Returns:
+		The names of the logged properties, and an iterator over the chunks.
+		Each chunk is a tuple of the string table, the fixed columns, and the property columns,
+		the columns being :class:`array.array` objects.
+
+	"""
+	f = open(path, 'rb')
+	assert f.read(len(MAGIC)) == MAGIC, "Not a SimPype binary log"
+	length, = struct.unpack('<I', f.read(4))
+	header = json.loads(f.read(length).decode())
+	swap = header['byteorder'] != sys.byteorder
+	properties = header['properties']
+	def columns(types, rows):
+		for n, t in types:
+			column = array.array(t)
+			column.frombytes(f.read(column.itemsize * rows))
+			if swap:
+				column.byteswap()
+			yield column
+	def chunks():
+		strings = []
+		with f:
+			while True:
+				size = f.read(8)
+				if len(size) < 8:
+					return
+				rows, length = struct.unpack('<II', size)
+				strings.extend(json.loads(f.read(length).decode()))
+				fixed = list(columns(COLUMNS, rows))
+				property = [list(columns(PROPERTY, rows)) for p in properties]
+				yield strings, fixed, property
+	return properties, chunks()
+
+
+def to_csv(path, out):
+	""" Convert a binary log file to the CSV format of ``sim.log``.
+
+	Args:
+		path (str):
+			The path of the binary log file
+		out (str):
+			The path of the CSV file
+
+	"""
+	properties, chunks = read(path)
+	with open(out, 'w') as f:
+		first = True
+		for strings, fixed, property in chunks:
+			if first:
+				f.write(",".join([n for n, t in COLUMNS] + properties) + "\n")
+				first = False
+			values = [
+				["%.9f" % t for t in fixed[0]],
+				[strings[c] for c in fixed[1]],
+				[str(s) for s in fixed[2]],
+				[strings[c] for c in fixed[3]],
+				[strings[c] for c in fixed[4]],
+			]
+			for kind, number, code in property:
+				values.append([str(n) if k == FLOAT else strings[c] for k, n, c in zip(kind, number, code)])
+			f.writelines(",".join(row) + "\n" for row in zip(*values))
@@ -1,15 +1,27 @@
 """
 SimPype's message.
 
+A message is the atomic unit flowing through the simulation, so its memory footprint bounds the number of messages in flight.
+To keep it small, :class:`Message` stores its attributes in slots and shares the pipeline of the generator that created it.
+The property and subscription dictionaries are created only when first used, and the history of the visited resources
+is kept only if enabled through :attr:`Message.history`.
+A message generated by a template without any property nor subscription takes less than ``MESSAGE_SIZE`` bytes of memory.
+
 """
 
+import collections
 import copy
 import inspect
 import simpy
 
 import simpype
 import simpype.build
+import simpype.distribution
+import simpype.timer
+
 
+# The memory target, in bytes, of a message without any property nor subscription
+MESSAGE_SIZE = 512
 
 class PropertyDict(dict):
 	""" A custom dictionary storing simpype.Property objects.
@@ -17,19 +29,37 @@ class PropertyDict(dict):
 	Args:
 		sim (:class:`~simpype.simulation.Simulation`):
 			The SimPype simulation object
+		path (str, optional):
+			The path of the message owning the dictionary, e.g. ``'message.gen0'``
 
 	Attributes:
 		sim (:class:`~simpype.simulation.Simulation`):
 			The SimPype simulation object
 		env (simpy.Environment): 
 			The SimPy environment object
+		path (str):
+			The path of the message owning the dictionary. Each dynamic property has its own
+			:class:`~simpype.random.Stream`, derived from this path and from the property name.
+		shared (bool):
+			True if the dictionary is shared by several messages, e.g. by the messages generated from a :class:`Template`.
+			A shared dictionary is read in place, and copied into the message modifying it (copy on write).
+		owner (:class:`Message`):
+			The message which last accessed the shared dictionary, receiving the copy on the next modification
+		version (int):
+			The modification counter of the dictionary, used by :class:`Template` to detect changes
 
 	"""
-	def __init__(self, sim):
+	__slots__ = ('sim', 'env', 'path', 'shared', 'owner', 'version')
+
+	def __init__(self, sim, path = None):
 		assert isinstance(sim, simpype.Simulation)
 		super().__init__()
 		self.sim = sim
 		self.env = sim.env
+		self.path = path
+		self.shared = False
+		self.owner = None
+		self.version = 0
 	
 	def __setitem__(self, key, value):
 		""" Automatically creates a simpype.Property object when assigning a value
@@ -41,18 +71,86 @@ class PropertyDict(dict):
 				The dictionaty value
 
 		"""
+		if self.shared:
+			return self._detach().__setitem__(key, value)
+		self.version += 1
 		# Don't create a simpype.Property object if value is already a simpype.Property object
 		if isinstance(value, Property):
 			super().__setitem__(key, value)
 		else:
-			super().__setitem__(key, Property(self.sim, key, value))
+			super().__setitem__(key, Property(self.sim, key, value, self.path + '.property.' + str(key) if self.path is not None else None))
+
+	def __delitem__(self, key):
+		if self.shared:
+			return self._detach().__delitem__(key)
+		self.version += 1
+		super().__delitem__(key)
+
+	def clear(self):
+		if self.shared:
+			return self._detach().clear()
+		self.version += 1
+		super().clear()
+
+	def pop(self, *args):
+		if self.shared:
+			return self._detach().pop(*args)
+		self.version += 1
+		return super().pop(*args)
+
+	def popitem(self):
+		if self.shared:
+			return self._detach().popitem()
+		self.version += 1
+		return super().popitem()
+
+	def setdefault(self, key, default = None):
+		if self.shared and key not in self:
+			return self._detach().setdefault(key, default)
+		if key not in self:
+			self[key] = default
+		return self[key]
+
+	def update(self, *args, **kwargs):
+		if self.shared:
+			return self._detach().update(*args, **kwargs)
+		for key, value in dict(*args, **kwargs).items():
+			self[key] = value
+
+	def _detach(self):
+		""" Copy the shared dictionary into its owner message, which is about to modify it
+
+		Returns:
+			:class:`PropertyDict`, the private copy of the owner
+		"""
+		property = self.copy()
+		if self.owner is not None and self.owner._property is self:
+			self.owner._property = property
+		return property
+
+	def copy(self):
+		""" Create a shallow copy of the dictionary, i.e. the simpype.Property objects are not copied.
+
+		Returns:
+			:class:`PropertyDict`
+		"""
+		property = PropertyDict.__new__(PropertyDict)
+		dict.update(property, self)
+		property.sim = self.sim
+		property.env = self.env
+		property.path = self.path
+		property.shared = False
+		property.owner = None
+		property.version = 0
+		return property
 
 
 class Property:
 	""" This class implements the properties used by simpype.Message objects.
 	
 	A property value can be either static or dynamic. In the latter case
-	the ``value`` must follow the simpype.Random value dictionary format.
+	the ``value`` must follow the simpype.Random value dictionary format, or be a
+	:class:`~simpype.distribution.Distribution` or a simpype.Random object.
 
 	Args:
 		sim (:class:`~simpype.simulation.Simulation`):
@@ -61,6 +159,8 @@ class Property:
 			The property name
 		value (any):
 			The property value
+		path (str, optional):
+			The path of the :class:`~simpype.random.Stream` of a dynamic property
 
 	Attributes:
 		sim (:class:`~simpype.simulation.Simulation`):
@@ -73,19 +173,33 @@ class Property:
 			The property value
 
 	"""
-	def __init__(self, sim, name, value):
+	__slots__ = ('sim', 'env', 'name', '_random', '_value')
+
+	def __init__(self, sim, name, value, path = None):
 		assert isinstance(sim, simpype.Simulation)
 		self.sim = sim
 		self.env = sim.env
 		self.name = name
 		# If ``value`` is a dictionary and contains lambda functions, create a simpype.Random object
-		if isinstance(value, dict) and [f for f in value.values() if inspect.isfunction(f)]:
-			self._random = simpype.Random(self.sim, value)
+		if isinstance(value, simpype.Random):
+			self._random = value
+			self._value = self._random.value
+		elif isinstance(value, simpype.distribution.Distribution) or (isinstance(value, dict) and [f for f in value.values() if inspect.isfunction(f) or isinstance(f, simpype.distribution.Distribution)]):
+			self._random = simpype.Random(self.sim, value, self.sim.stream(path) if path is not None else None)
 			self._value = self._random.value
 		else:
 			self._random = None
 			self._value = value
 
+	@property
+	def is_static(self):
+		""" True if the value of the simpype.Property never changes, i.e. it is not a simpype.Random value.
+
+		Static properties are never modified in place and can be shared by several messages.
+
+		"""
+		return self._random is None
+
 	@property
 	def value(self):
 		""" The value of the simpype.Property. """
@@ -97,8 +211,12 @@ class Property:
 		Returns:
 			:class:`Property`
 		"""
-		property = Property(self.sim, self.name, self._value)
+		property = Property.__new__(Property)
+		property.sim = self.sim
+		property.env = self.env
+		property.name = self.name
 		property._random = self._random
+		property._value = self._value
 		return property
 
 	def refresh(self):
@@ -143,13 +261,16 @@ class Timestamp:
 		self.message = message
 		self.timestamp = float(timestamp)
 		self.resource = resource
-		self.description = str(description)
+		self.description = description if type(description) is str else str(description)
 
 
 class Subscription:
 	""" This class implements the subscriptions used by simpype.Message objects.
 
 	Subscription used to execute a given function upong some events triggering.
+	In ``process`` mode, the subscription is served by a SimPy process waiting for either the event or the ``disable`` event.
+	In ``callback`` mode, the subscription is attached directly to the callbacks of the event, and
+	it is cancelled by marking it as not alive, without any process nor further event.
 
 	Args:
 		sim (:class:`~simpype.simulation.Simulation`):
@@ -162,6 +283,8 @@ class Subscription:
 			The python function to call upon event triggering
 		id (str):
 			The simpype.Subscription id
+		mode (str, optional):
+			The subscription mode, either ``'process'`` or ``'callback'``
 
 	Attributes:
 		sim (:class:`~simpype.simulation.Simulation`):
@@ -176,21 +299,56 @@ class Subscription:
 			The python function to call upon event triggering
 		id (str):
 			The simpype.Subscription id
+		mode (str):
+			The subscription mode, either ``'process'`` or ``'callback'``
+		is_alive (bool):
+			False once the subscription has been cancelled or its callback executed
 		disable (simpy.Event):
-			The Simpy event used to remove the subscription
+			The Simpy event used to remove the subscription, ``None`` in ``callback`` mode
 
 	"""
-	def __init__(self, sim, message, event, callback, id):
+	def __init__(self, sim, message, event, callback, id, mode = 'process'):
 		assert isinstance(sim, simpype.Simulation)
 		assert isinstance(message, Message)
 		assert callable(callback)
+		assert mode in ('process', 'callback')
 		self.sim = sim
 		self.env = sim.env
 		self.message = message
 		self.event = event
 		self.callback = callback
 		self.id = id
-		self.disable = self.env.event()
+		self.mode = mode
+		self.is_alive = True
+		self.disable = self.env.event() if mode == 'process' else None
+
+	def _remove(self):
+		""" Remove the subscription from the message, unless it has been replaced by a new one with the same id """
+		if self.message._subscription.get(self.id) is self:
+			del self.message._subscription[self.id]
+
+	def _trigger(self, event):
+		""" Execute the callback upon ``event`` triggering, in ``callback`` mode """
+		if not self.is_alive:
+			return
+		self.is_alive = False
+		self._remove()
+		message = self.message
+		# A failed event is not defused, so that SimPy raises its exception
+		if event.ok and message.is_alive:
+			self.callback(message, event.value)
+		if message._releasing and not message._subscription:
+			self.sim.pool.release(message)
+
+	def cancel(self):
+		""" Cancel the subscription. """
+		if not self.is_alive:
+			return
+		self.is_alive = False
+		if self.disable is not None:
+			self.disable.succeed()
+		else:
+			self._remove()
 
 
 class Message:
@@ -217,21 +375,29 @@ class Message:
 			The simulation time when this object was generated.
 		generator (:class:`~simpype.resource.Resource`):
 			The simpype.Resource that created the message.
+		history (int):
+			The maximum number of visited resources remembered in ``visited``.
+			``0`` disables the history (default), ``None`` keeps the whole history.
 		is_alive (bool):
 			The boolean value marking if the message is alive or not. 
 			A message is not alive when no further steps are available or if it is used as a template by a generator.
 		location (:class:`~simpype.resource.Resource`:class:`~simpype.pipe.Pipe`:class:`~simpype.queue.Queue`):
 			The location of the simpype.Message inside the simulation pipeline.
 		property (:class:`PropertyDict`): 
-			The PropertyDict dictionary storing the :class:`Property` objects
+			The PropertyDict dictionary storing the :class:`Property` objects. It is created on first use.
 		seq_num (int):
 			The sequence number of the message
 		subscription (dict):
-			The dictionary storing the Subscription objects
-		visited (list):
-			The list of the visited simpype.Resource objects
+			The dictionary storing the Subscription objects. It is created on first use.
+		visited (collections.deque):
+			The last ``history`` visited simpype.Resource objects
 
 	"""
+	__slots__ = (
+		'sim', 'env', 'id', 'generated', 'generator', 'is_alive', 'log', 'location', 'seq_num',
+		'_history', '_property', '_subscription', '_visited', '_next', '_resource', '_pipeline', '_releasing',
+	)
+
 	def __init__(self, sim, resource, id):
 		assert isinstance(sim, simpype.Simulation)
 		assert isinstance(resource, simpype.Resource)
@@ -243,19 +409,49 @@ class Message:
 		self.is_alive = True
 		self.log = True
 		self.location = resource
-		self.property = PropertyDict(self.sim)
 		self.seq_num = 0
-		self.subscription = {}
-		self.visited = []
-		self.next = {}
+		self._history = 0
+		self._property = None
+		self._subscription = None
+		self._visited = None
+		self._next = simpype.pipeline.EMPTY
+		self._releasing = False
+		self._pipeline = simpype.Pipeline(self.sim, self.id)
 		self.resource = resource
-		self.pipeline = simpype.Pipeline(self.sim, self.id)
+
+	@property
+	def history(self):
+		""" The maximum number of visited resources remembered in ``visited``. 
+
+		``0`` disables the history, ``None`` keeps the whole history.
+
+		"""
+		return self._history
+
+	@history.setter
+	def history(self, value):
+		assert value is None or (isinstance(value, int) and value >= 0)
+		self._history = value
+		self._visited = collections.deque(self.visited, value) if value != 0 else None
+
+	@property
+	def subscription(self):
+		""" The dictionary storing the :class:`Subscription` objects. """
+		if self._subscription is None:
+			self._subscription = {}
+		return self._subscription
+
+	@property
+	def visited(self):
+		""" The last ``history`` visited simpype.Resource objects. """
+		return self._visited if self._visited is not None else ()
 
 	@property
 	def next(self):
 		""" The next resources available to the message in the form of adjency list 
 
-		Next property admits only simpype.Resource, simpype.Pipeline, and next-compatible values
+		Next property admits only simpype.Resource, simpype.Pipeline, and next-compatible values.
+		The adjency list looked up in the pipeline is read-only, since it is shared by all the messages.
 
 		"""
 		return self._next
@@ -284,8 +480,7 @@ class Message:
 	def pipeline(self, value):
 		assert isinstance(value, simpype.Pipeline)
 		self._pipeline = value
-		if hasattr(self, 'resource'):
-			self._update_next()
+		self._update_next()
 
 	@property
 	def resource(self):
@@ -300,61 +495,109 @@ class Message:
 	def resource(self, value):
 		assert isinstance(value, simpype.Resource)
 		self._resource = value
-		self.visited.append(value)
-		if hasattr(self, 'pipeline'):
-			self._update_next()
+		if self._visited is not None:
+			self._visited.append(value)
+		self._update_next()
+
+	# Defined last since it shadows the builtin ``property`` in the class body
+	@property
+	def property(self):
+		""" The PropertyDict dictionary storing the :class:`Property` objects.
+
+		A dictionary shared with other messages is handed out as it is, and copied into this message
+		on its first modification. Hence, don't keep it across the accesses to the properties of other messages.
+		"""
+		if self._property is None:
+			self._property = PropertyDict(self.sim, 'message.' + str(self.id))
+		elif self._property.shared:
+			# Copy on write: the next modification of the shared dictionary is redirected to a copy owned by this message
+			self._property.owner = self
+		return self._property
 
 	def _drop(self, message, cause):
 		""" The callback function fro dropping a message """
 		self.done()
-		self.location._message_dropped(self, cause)
+		location = self.location
+		location._message_dropped(self, cause)
+		# Messages dropped by a resource are released once their task is over
+		if isinstance(location, simpype.Queue):
+			self.sim.pool.release(self)
+
+	def _copy_property(self, source):
+		""" Set the properties to a shallow copy of ``source``, reusing the dictionary of a recycled message """
+		if self._property is None or self._property.shared:
+			self._property = source.copy()
+		else:
+			self._property.path = source.path
+			dict.update(self._property, source)
 
 	def _update_next(self):
-		""" Update the next adjency list based on the current resource managing the message """
-		if self.resource.id in self.pipeline.resource:
-			self.next = {p.id: p for p in self.pipeline.resource[self.resource.id]}
-		else:
-			self.next = {}
+		""" Look up the next adjency list of the current resource in the routing table of the pipeline """
+		routes = self._pipeline._routes
+		if routes is None:
+			routes = self._pipeline.routes
+		self._next = routes.get(self._resource.id, simpype.pipeline.EMPTY)
 
 	def _wait_event(self, subscription):
 		""" Wait the triggering of an event and execute the associated callbak """
 		value = yield subscription.event | subscription.disable
 		if subscription.event in value and self.is_alive:
+			subscription.is_alive = False
 			subscription.callback(self, value[subscription.event])
-		if subscription.id in self.subscription:
-			del self.subscription[subscription.id]
+		subscription._remove()
+		if self._releasing and not self._subscription:
+			self.sim.pool.release(self)
 	
-	def copy(self):
+	def copy(self, property = True):
 		""" Create a dopy of this simpype.Message object. 
-		
+
+		Args:
+			property (bool, optional):
+				If False, the properties are not copied
+
 		Returns:
 			:class:`Message`
 
 		"""
-		message = Message(self.sim, self.generator, self.id)
-		message.generated = copy.deepcopy(self.generated)
-		message.resource = self.resource
+		message = self.sim.pool.acquire()
+		message.sim = self.sim
+		message.env = self.env
+		message.id = self.id
+		message.generated = self.generated
+		message.generator = self.generator
+		message.is_alive = self.is_alive
+		message.log = self.log
 		message.location = self.location
-		message.seq_num = copy.deepcopy(self.seq_num)
-		message.visited = copy.copy(self.visited)
-		message.is_alive = copy.deepcopy(self.is_alive)
-		message.log = copy.deepcopy(self.log)
-		message.next = copy.copy(self.next)
-		message.pipeline = copy.copy(self.pipeline)
-		for p in self.property.values():
-			message.property[p.name] = p.copy()
-		for id,s in self.subscription.items():
-			c = getattr(message, s.callback.__name__) if inspect.ismethod(s.callback) else s.callback
-			s = message.subscribe(event = s.event, callback = c, id = id)
+		message.seq_num = self.seq_num
+		message._history = self._history
+		message._visited = copy.copy(self._visited)
+		message._releasing = False
+		# The pipeline is shared with this message, not copied
+		message._pipeline = self._pipeline
+		message._resource = self._resource
+		message._update_next()
+		if property and self._property:
+			if self._property.shared:
+				message._property = self._property
+			else:
+				# Static properties are shared, only the dynamic ones are copied
+				message._copy_property(self._property)
+				for k,p in self._property.items():
+					if not p.is_static:
+						dict.__setitem__(message._property, k, p.copy())
+		if self._subscription:
+			for id,s in self._subscription.items():
+				c = getattr(message, s.callback.__name__) if inspect.ismethod(s.callback) else s.callback
+				s = message.subscribe(event = s.event, callback = c, id = id, mode = s.mode)
 		return message
 
 	def done(self):
 		""" Deactivate the message, empty the next adjency list, and defuse all the active subscriptions """
 		self.is_alive = False
-		self.next = {}
-		e_list = list(self.subscription.keys())
-		for id in e_list:
-			self.unsubscribe(id)
+		self._next = simpype.pipeline.EMPTY
+		if self._subscription:
+			for id in list(self._subscription.keys()):
+				self.unsubscribe(id)
 
 	def drop(self, id = 'dropped', event = None):
 		""" Drop the simpype.Message object from the simulation.
@@ -364,51 +607,88 @@ class Message:
 		Args:
 			id (str, optional):
 				The id identifying in the log this drop action
-			event (simpy.Event, optional):
+			event (simpy.Event, :class:`~simpype.timer.Deadline`, optional):
 				The event that will trigger the message dropping
 
 		"""
 		if event is None:
 			self._drop(self, id)
 		else:
-			assert isinstance(event, simpy.Event)
+			assert isinstance(event, (simpy.Event, simpype.timer.Deadline))
 			e = self.subscribe(event = event, callback = self._drop, id = id)
 
-	def subscribe(self, event, callback, id):
+	def subscribe(self, event, callback, id, mode = None):
 		""" Subscribe the message to a given event which will execute a callback function.
 
+		In ``callback`` mode, the callback is attached directly to the event and no process is created (see :class:`Subscription`).
+		If ``event`` is a :class:`~simpype.timer.Deadline`, the deadline itself is the subscription and no process is created.
+
 		Args:
-			event (simpy.Event):
+			event (simpy.Event, :class:`~simpype.timer.Deadline`):
 				The simpy.Event to subscribe to
 			callback (user-defined python function):
 				The function to call upon event triggering
 			id (str):
 				The id identifying this subscription
+			mode (str, optional):
+				Either ``'process'`` or ``'callback'``. Default value is the engine of the simulation.
 
 		Returns:
-			:class:`Subscription`
+			:class:`Subscription`, :class:`~simpype.timer.Deadline`
 
 		"""
-		assert isinstance(event, simpy.Event)
+		assert isinstance(event, (simpy.Event, simpype.timer.Deadline))
 		assert callable(callback)
 		if id in self.subscription:
 			self.unsubscribe(id)
-		s = Subscription(self.sim, self, event, callback, id)
-		self.subscription[id] = s
-		self.env.process(self._wait_event(s))
+		if isinstance(event, simpype.timer.Deadline):
+			# A deadline serves a single subscription, e.g. the copy of a message gets its own deadline
+			if event.message is not None or event.cancelled:
+				event = event.timer.at(event.time, event.value)
+			event.message = self
+			event.callback = callback
+			event.id = id
+			self._subscription[id] = event
+			return event
+		s = Subscription(self.sim, self, event, callback, id, self.sim.engine if mode is None else mode)
+		self._subscription[id] = s
+		if s.mode == 'process':
+			self.env.process(self._wait_event(s))
+		elif event.callbacks is not None:
+			event.callbacks.append(s._trigger)
+		else:
+			# The event has already been processed: trigger the subscription as soon as possible
+			e = self.env.event()
+			e.callbacks.append(s._trigger)
+			if event.ok:
+				e.succeed(event.value)
+			else:
+				e.fail(event.value)
 		return s
 
 	def timestamp(self, description):
 		""" Create and write a timestamp to the log file 
 		
+		Nothing is created if the event is not logged.
+
 		Args:
 			description (str):
 				The timestamp description
-		
+
+		Returns:
+			:class:`Timestamp`, ``None`` if the event is not logged, e.g. if it is filtered out by the log,
+			see :meth:`~simpype.simulation.Log.include`
+
 		"""
+		if not (self.log and self.location.log):
+			return None
+		log = self.sim.log
+		if not (log.file or log.print):
+			return None
+		if log._filter is not None and not log._filter(self, description):
+			return None
 		ts = Timestamp(self, self.env.now, self.resource, description)
-		if self.log and self.location.log:
-			self.sim.log.write(ts)
+		log._write_log(ts)
 		return ts
 
 	def unsubscribe(self, id):
@@ -420,4 +700,223 @@ class Message:
 
 		"""
 		assert id in self.subscription
-		self.subscription[id].disable.succeed()
+		self.subscription[id].cancel()
+
+
+class Template:
+	""" This class implements the flyweight compiled from a template simpype.Message object.
+
+	The messages generated from a template share its static properties by reference, while its dynamic
+	properties (i.e., the simpype.Random ones) are copied and refreshed for every message.
+	When the template has no dynamic properties, the generated messages share the whole property dictionary
+	until they modify it, which copies the dictionary into the modifying message first (copy on write).
+	The template is compiled again whenever the properties of the template message change.
+
+	Args:
+		message (:class:`Message`):
+			The template message
+
+	Attributes:
+		message (:class:`Message`):
+			The template message
+
+	"""
+	__slots__ = ('message', '_source', '_version', '_property', '_dynamic')
+
+	def __init__(self, message):
+		assert isinstance(message, Message)
+		self.message = message
+		self._source = None
+		self._version = None
+		self._property = None
+		self._dynamic = ()
+
+	def _compile(self):
+		""" Compile the properties of the template message """
+		source = self.message._property
+		self._source = source
+		self._version = source.version if source is not None else None
+		self._property = None
+		self._dynamic = ()
+		if source:
+			self._property = source.copy()
+			self._property.shared = True
+			self._dynamic = tuple((k,p) for k,p in source.items() if not p.is_static)
+
+	def generate(self):
+		""" Generate a new message from the template, with freshly drawn dynamic properties.
+
+		Returns:
+			:class:`Message`
+
+		"""
+		source = self.message._property
+		if source is not self._source or (source is not None and source.version != self._version):
+			self._compile()
+		message = self.message.copy(property = False)
+		if self._dynamic:
+			message._copy_property(self._property)
+			for k,p in self._dynamic:
+				p = p.copy()
+				p.refresh()
+				dict.__setitem__(message._property, k, p)
+		else:
+			message._property = self._property
+		return message
+
+	def generate_batch(self, n):
+		""" Generate ``n`` new messages from the template at once.
+
+		The dynamic properties following a :class:`~simpype.distribution.Distribution` are sampled for all the messages at once,
+		the other ones are refreshed message by message as in :meth:`generate`.
+
+		Args:
+			n (int):
+				The number of messages
+
+		Returns:
+			list of :class:`Message`
+
+		"""
+		source = self.message._property
+		if source is not self._source or (source is not None and source.version != self._version):
+			self._compile()
+		messages = [self.message.copy(property = False) for i in range(n)]
+		if not self._dynamic:
+			for message in messages:
+				message._property = self._property
+			return messages
+		sampled = {}
+		for k,p in self._dynamic:
+			random = p._random
+			if random.step_list[random._step(self.message.env.now)].distribution is not None:
+				sampled[k] = random.sample(n)
+		for i,message in enumerate(messages):
+			message._copy_property(self._property)
+			for k,p in self._dynamic:
+				p = p.copy()
+				if k in sampled:
+					p._value = sampled[k][i]
+				else:
+					p.refresh()
+				dict.__setitem__(message._property, k, p)
+		return messages
+
+
+class _ReleasedMessage(Message):
+	""" The class of the messages released to a :class:`Pool` in debug mode, failing on any access """
+	__slots__ = ()
+
+	def __getattribute__(self, name):
+		raise ReferenceError("Message used after being released to the pool")
+
+	def __setattr__(self, name, value):
+		raise ReferenceError("Message used after being released to the pool")
+
+
+class Pool:
+	""" This class implements the pool recycling the simpype.Message objects that left the simulation.
+
+	When enabled, a message is released to the pool once it is done, i.e. once it leaves its last resource
+	or it is dropped from a queue, and after all its subscriptions are over.
+	The released messages, and their property and subscription dictionaries, are reused by :meth:`Message.copy`,
+	e.g. for the messages created by a generator.
+	A released message must not be referenced anymore: in debug mode any access to a released message
+	raises a ``ReferenceError``, and the released messages are reused in FIFO order to widen the detection window.
+
+	Args:
+		sim (:class:`~simpype.simulation.Simulation`):
+			The SimPype simulation object
+
+	Attributes:
+		sim (:class:`~simpype.simulation.Simulation`):
+			The SimPype simulation object
+		env (simpy.Environment):
+			The SimPy environment object
+		enabled (bool):
+			True if the messages are recycled. Default value is ``False``.
+		debug (bool):
+			True if the use of released messages is detected. Default value is ``False``.
+		limit (int):
+			The maximum number of messages kept in the pool, ``None`` for no limit. Default value is ``None``.
+		hit (int):
+			The number of messages reused from the pool
+		miss (int):
+			The number of messages allocated because the pool was empty
+		released (int):
+			The number of messages released to the pool
+
+	"""
+	def __init__(self, sim):
+		assert isinstance(sim, simpype.Simulation)
+		self.sim = sim
+		self.env = sim.env
+		self.enabled = False
+		self.debug = False
+		self.limit = None
+		self.hit = 0
+		self.miss = 0
+		self.released = 0
+		self._free = collections.deque()
+
+	def __len__(self):
+		return len(self._free)
+
+	@property
+	def hit_rate(self):
+		""" The fraction of messages reused from the pool. """
+		total = self.hit + self.miss
+		return self.hit / total if total else 0.0
+
+	def acquire(self):
+		""" Get a message from the pool, or allocate a new one if the pool is disabled or empty.
+
+		The attributes of the returned message must be all initialized by the caller,
+		except for the property and subscription dictionaries which are either ``None`` or empty.
+
+		Returns:
+			:class:`Message`
+
+		"""
+		if self.enabled:
+			if self._free:
+				self.hit += 1
+				if self.debug:
+					message = self._free.popleft()
+					object.__setattr__(message, '__class__', Message)
+				else:
+					message = self._free.pop()
+				return message
+			self.miss += 1
+		message = Message.__new__(Message)
+		message._property = None
+		message._subscription = None
+		return message
+
+	def release(self, message):
+		""" Release a message that is done to the pool.
+
+		If the message has still some pending subscriptions, it is released when the last one is over.
+
+		Args:
+			message (:class:`Message`):
+				The message to release
+
+		"""
+		if not self.enabled:
+			return
+		assert not message.is_alive
+		if message._subscription:
+			message._releasing = True
+			return
+		message._releasing = False
+		if message._property is not None:
+			if message._property.shared:
+				message._property = None
+			else:
+				dict.clear(message._property)
+		self.released += 1
+		if self.limit is None or len(self._free) < self.limit:
+			if self.debug:
+				object.__setattr__(message, '__class__', _ReleasedMessage)
+			self._free.append(message)
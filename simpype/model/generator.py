@@ -5,6 +5,7 @@ class Generator(simpype.Resource):
 	def __init__(self, sim, id):
 		super().__init__(sim, id)
 		self.message = simpype.Message(self.sim, self, self.id)
+		self.template = simpype.message.Template(self.message)
 		self.counter = 0
 		self.to_send = float("inf")
 		# Init
@@ -14,15 +15,26 @@ class Generator(simpype.Resource):
 		self.a_gen = self.env.process(self.h_gen())
 
 	def gen_message(self):
-		message = self.message.copy()
-		message.seq_num = self.counter
+		if self.template.message is not self.message:
+			self.template = simpype.message.Template(self.message)
+		message = self.template.generate()
+		self._init_message(message, self.counter)
+		return message
+
+	def gen_messages(self, n):
+		if self.template.message is not self.message:
+			self.template = simpype.message.Template(self.message)
+		messages = self.template.generate_batch(n)
+		for i, message in enumerate(messages):
+			self._init_message(message, self.counter + i)
+		return messages
+
+	def _init_message(self, message, seq_num):
+		message.seq_num = seq_num
 		message.generated = self.env.now
-		for p in message.property.values():
-			p.refresh()
-		if 'lifetime' in message.property:
-			message.drop('lifetime', self.env.timeout(message.property['lifetime'].value, 'expired'))
+		if message._property and 'lifetime' in message._property:
+			message.drop('lifetime', self.sim.timer.timeout(message._property['lifetime'].value, 'expired'))
 		message.is_alive = True
-		return message
 
 	def h_gen(self):
 		more = True
@@ -32,10 +44,19 @@ class Generator(simpype.Resource):
 				more = False
 			else:
 				yield self.env.timeout(val)
-				for i in range(0, self.random['quantity'].value):
-					message = self.gen_message()
-					self.send(message)
-					self.counter = self.counter + 1
+				self.gen_arrival()
+
+	def gen_arrival(self):
+		quantity = self.random['quantity'].value
+		if quantity == 1:
+			message = self.gen_message()
+			self.send(message)
+			self.counter = self.counter + 1
+		elif quantity > 1:
+			# Batch arrival
+			messages = self.gen_messages(quantity)
+			self.send_batch(messages)
+			self.counter = self.counter + quantity
 
 # Do NOT remove
 resource = lambda *args: Generator(*args)
@@ -0,0 +1,158 @@
+"""
+SimPype's non-homogeneous Poisson generator model.
+
+The arrivals follow a time-varying rate, given either as a piecewise-linear table or as a function.
+They are computed in blocks, by inversion of the cumulative rate for a table and by thinning for a function,
+and handed out one at a time.
+
+.. code-block :: python
+
+	gen0 = sim.add_generator(id = 'gen0', model = 'nhpp')
+	# Messages per second, linearly interpolated between the breakpoints
+	gen0.rate = {
+		0	: 0.0,
+		3600	: 2.0,
+		7200	: 0.5,
+	}
+	# Or a function, bounded by rate_max
+	gen0.rate = lambda t: 1.0 + math.sin(t / 3600.0)
+	gen0.rate_max = 2.0
+
+"""
+
+import bisect
+import math
+
+import simpype
+import simpype.model.generator
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+class NHPP(simpype.model.generator.Generator):
+	""" A generator whose arrivals follow a non-homogeneous Poisson process.
+
+	Args:
+		sim (:class:`~simpype.simulation.Simulation`):
+			The SimPype simulation object
+		id (str):
+			The generator id
+
+	Attributes:
+		rate (dict, callable):
+			The rate of the arrivals. A dictionary maps the simulation times to the rates, linearly interpolated in between:
+			the rate is 0 before the first time and constant after the last one.
+			A function takes the simulation time and returns the rate. With NumPy it is first called with an array of times,
+			and called for each time if it fails.
+		rate_max (float):
+			The upper bound of a rate function, required for thinning
+		block (int):
+			The number of arrivals computed at once
+
+	"""
+	def __init__(self, sim, id):
+		super().__init__(sim, id)
+		self.rate = {0: 0.0}
+		self.rate_max = None
+		self.block = 4096
+
+	def h_gen(self):
+		start = self.env.now
+		while self.counter < self.to_send and start is not None:
+			schedule, end = self._schedule(start)
+			for t in schedule:
+				if self.counter >= self.to_send:
+					break
+				yield self.env.timeout(t - self.env.now)
+				self.gen_arrival()
+			# A block without arrivals still moves the simulation time forward
+			if not schedule and end is not None:
+				yield self.env.timeout(end - self.env.now)
+			start = end
+
+	def _schedule(self, start):
+		""" Compute the next block of arrival times after ``start``.
+
+		Returns the arrival times and the time the next block starts from, ``None`` if there are no more arrivals.
+		"""
+		if callable(self.rate):
+			return self._thinning(start)
+		schedule = self._inversion(start)
+		return schedule, schedule[-1] if schedule else None
+
+	def _inversion(self, start):
+		""" Invert the cumulative rate of the piecewise-linear table at the points of a unit-rate Poisson process """
+		times = sorted(self.rate)
+		rates = [float(self.rate[t]) for t in times]
+		assert min(rates) >= 0
+		# The cumulative rate at each breakpoint
+		cumulative = [0.0]
+		for i in range(1, len(times)):
+			cumulative.append(cumulative[-1] + (rates[i-1] + rates[i]) * (times[i] - times[i-1]) / 2.0)
+		offset = self._cumulative(start, times, rates, cumulative)
+		if numpy is not None:
+			rng = self.stream.numpy
+			y = offset + numpy.cumsum(rng.exponential(1.0, self.block))
+			if rates[-1] == 0:
+				y = y[y < cumulative[-1]]
+			i = numpy.searchsorted(cumulative, y, side = 'right') - 1
+			t0 = numpy.asarray(times, dtype = float)
+			r0 = numpy.asarray(rates)
+			slope = numpy.append(numpy.diff(r0) / numpy.maximum(numpy.diff(t0), 1e-300), 0.0)
+			d = y - numpy.asarray(cumulative)[i]
+			r = r0[i]
+			a = slope[i]
+			# Stable root of r*s + a*s^2/2 = d, also for a = 0 or r = 0
+			s = 2.0 * d / (r + numpy.sqrt(numpy.maximum(r * r + 2.0 * a * d, 0.0)))
+			return (t0[i] + s).tolist()
+		rng = self.stream.random
+		schedule = []
+		y = offset
+		for k in range(self.block):
+			y += rng.expovariate(1.0)
+			if rates[-1] == 0 and y >= cumulative[-1]:
+				break
+			i = bisect.bisect_right(cumulative, y) - 1
+			r = rates[i]
+			a = (rates[i+1] - r) / (times[i+1] - times[i]) if i+1 < len(times) else 0.0
+			d = y - cumulative[i]
+			schedule.append(times[i] + 2.0 * d / (r + math.sqrt(max(r * r + 2.0 * a * d, 0.0))))
+		return schedule
+
+	@staticmethod
+	def _cumulative(t, times, rates, cumulative):
+		""" The cumulative rate at time ``t`` """
+		i = bisect.bisect_right(times, t) - 1
+		if i < 0:
+			return 0.0
+		s = t - times[i]
+		a = (rates[i+1] - rates[i]) / (times[i+1] - times[i]) if i+1 < len(times) else 0.0
+		return cumulative[i] + rates[i] * s + a * s * s / 2.0
+
+	def _thinning(self, start):
+		""" Thin a homogeneous Poisson process with rate ``rate_max`` """
+		assert self.rate_max is not None and self.rate_max > 0
+		rate_max = self.rate_max
+		if numpy is not None:
+			rng = self.stream.numpy
+			t = start + numpy.cumsum(rng.exponential(1.0 / rate_max, self.block))
+			u = rng.random(self.block) * rate_max
+			try:
+				r = numpy.broadcast_to(numpy.asarray(self.rate(t), dtype = float), t.shape)
+			except (TypeError, ValueError):
+				r = numpy.fromiter((self.rate(x) for x in t.tolist()), dtype = float, count = self.block)
+			return t[u < r].tolist(), float(t[-1])
+		rng = self.stream.random
+		schedule = []
+		t = start
+		for k in range(self.block):
+			t += rng.expovariate(rate_max)
+			if rng.random() * rate_max < self.rate(t):
+				schedule.append(t)
+		return schedule, t
+
+# Do NOT remove
+resource = lambda *args: NHPP(*args)
@@ -8,7 +8,7 @@ class Resource(simpype.Resource):
 	
 	@simpype.resource.service
 	def service(self, message):
-		yield self.env.timeout(self.random['service'].value)
+		return self.env.timeout(self.random['service'].value)
 
 
 # Do NOT remove
@@ -0,0 +1,100 @@
+"""
+SimPype's superposition generator model.
+
+A single generator emits the messages of many independent sources, e.g. customers.
+The next arrival time of every source is kept in one heap, and the generator only waits for the earliest one,
+so that a single process and a single pending event serve any number of sources.
+Each message carries the id of its source in the ``source`` property.
+
+.. code-block :: python
+
+	from simpype.distribution import Exponential
+
+	gen0 = sim.add_generator(id = 'gen0', model = 'superposition')
+	# Each source samples its own copy of the distribution from its own stream:
+	# small blocks keep the memory of many sources low
+	arrival = Exponential(1.0 / 3600.0, block = 64)
+	for i in range(10000):
+		gen0.add_source('customer%d' % i, arrival)
+
+"""
+
+import heapq
+import itertools
+import simpy
+
+import simpype
+import simpype.model.generator
+
+
+class Superposition(simpype.model.generator.Generator):
+	""" A generator emitting the messages of many independent sources from one process.
+
+	Args:
+		sim (:class:`~simpype.simulation.Simulation`):
+			The SimPype simulation object
+		id (str):
+			The generator id
+
+	Attributes:
+		source (:class:`~simpype.random.RandomDict`):
+			The inter-arrival times of each source, in the :class:`~simpype.random.Random` format.
+			Each source has its own stream, and its own copy of a distribution shared with other sources.
+
+	"""
+	def __init__(self, sim, id):
+		super().__init__(sim, id)
+		self.source = simpype.random.RandomDict(self.sim, 'resource.' + str(self.id) + '.source')
+		self._heap = []
+		self._seq = itertools.count()
+		# The time the generator is waiting for, None while it is running
+		self._wait = None
+
+	def add_source(self, id, arrival):
+		""" Add a source, whose first message arrives after its first inter-arrival time.
+
+		Args:
+			id (str):
+				The source id, stamped on its messages
+			arrival (dict, :class:`~simpype.distribution.Distribution`):
+				The inter-arrival times of the source, in the :class:`~simpype.random.Random` format
+
+		"""
+		assert id not in self.source
+		self.source[id] = arrival
+		self._push(id, self.env.now)
+		# Wake the generator up if the new source arrives first
+		if self._wait is not None and self._heap and self._heap[0][0] < self._wait:
+			self.a_gen.interrupt()
+
+	def _push(self, id, now):
+		""" Schedule the next arrival of a source, if any """
+		val = self.source[id].value
+		if val is not None:
+			# The sequence number breaks the ties without comparing the ids
+			heapq.heappush(self._heap, (now + val, next(self._seq), id))
+
+	def h_gen(self):
+		heap = self._heap
+		while self.counter < self.to_send:
+			time, seq, id = heap[0] if heap else (float("inf"), None, None)
+			if time > self.env.now:
+				self._wait = time
+				try:
+					# Without sources, wait for a source to be added
+					yield self.env.timeout(time - self.env.now) if heap else self.env.event()
+				except simpy.Interrupt:
+					pass
+				self._wait = None
+				continue
+			heapq.heappop(heap)
+			messages = self.gen_messages(self.random['quantity'].value)
+			for message in messages:
+				message.property['source'] = id
+			self.send_batch(messages)
+			self.counter = self.counter + len(messages)
+			self._push(id, time)
+
+
+# Do NOT remove
+resource = lambda *args: Superposition(*args)
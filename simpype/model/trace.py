@@ -0,0 +1,127 @@
+"""
+SimPype's trace-replay generator model.
+
+The arrivals are read from a trace: each row holds the simulation time of an arrival
+and the properties of the generated message. The trace is either:
+
+	* a CSV file with a header, read line by line;
+	* a directory holding one NumPy ``.npy`` file per column, e.g. ``time.npy`` and ``size.npy``,
+	  memory-mapped and read in blocks.
+
+In both cases the memory used does not depend on the length of the trace.
+
+.. code-block :: python
+
+	gen0 = sim.add_generator(id = 'gen0', model = 'trace')
+	gen0.trace = 'arrivals.csv'
+	# Map the columns to the message properties, all the columns by default
+	gen0.columns = {'bytes': 'size'}
+	# Convert the CSV strings, kept as strings by default
+	gen0.converters = {'bytes': int}
+
+"""
+
+import csv
+import os
+
+import simpype
+import simpype.model.generator
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+class Trace(simpype.model.generator.Generator):
+	""" A generator replaying the arrivals of a trace.
+
+	Each row of the trace generates one message, at the simulation time of the row.
+	The rows must be sorted by time.
+
+	Args:
+		sim (:class:`~simpype.simulation.Simulation`):
+			The SimPype simulation object
+		id (str):
+			The generator id
+
+	Attributes:
+		trace (str):
+			The path of the CSV file or of the directory of ``.npy`` files
+		time (str):
+			The name of the column storing the arrival times
+		columns (dict):
+			The properties set from the columns, mapping the column names to the property names.
+			If ``None``, every column other than the time sets the property with the same name.
+		converters (dict):
+			The functions converting the values of the CSV columns, mapping the column names to the functions
+		block (int):
+			The number of rows read at once from the ``.npy`` files
+
+	"""
+	def __init__(self, sim, id):
+		super().__init__(sim, id)
+		self.trace = None
+		self.time = 'time'
+		self.columns = None
+		self.converters = {}
+		self.block = 4096
+
+	def h_gen(self):
+		if self.trace is None:
+			return
+		names, rows = self._rows()
+		for row in rows:
+			if self.counter >= self.to_send:
+				break
+			if row[0] > self.env.now:
+				yield self.env.timeout(row[0] - self.env.now)
+			message = self.gen_message()
+			for name, value in zip(names, row[1:]):
+				message.property[name] = value
+			self.send(message)
+			self.counter = self.counter + 1
+
+	def _select(self, header):
+		""" The positions of the time and property columns, and the property names """
+		assert self.time in header
+		columns = self.columns if self.columns is not None else {c: c for c in header if c != self.time}
+		positions = [header.index(self.time)] + [header.index(c) for c in columns]
+		return positions, list(columns.values())
+
+	def _rows(self):
+		""" The property names and the iterator over the rows ``(time, value, ...)`` """
+		if os.path.isdir(self.trace):
+			return self._npy()
+		return self._csv()
+
+	def _csv(self):
+		with open(self.trace, newline = '') as f:
+			header = next(csv.reader(f))
+		positions, names = self._select(header)
+		convert = [float] + [self.converters.get(header[p], str) for p in positions[1:]]
+		def rows():
+			# Opened by the generator, and closed when it is exhausted or closed
+			with open(self.trace, newline = '') as f:
+				reader = csv.reader(f)
+				next(reader)
+				for line in reader:
+					yield [c(line[p]) for c, p in zip(convert, positions)]
+		return names, rows()
+
+	def _npy(self):
+		assert numpy is not None, "Reading a trace of .npy files requires NumPy"
+		header = sorted(f[:-4] for f in os.listdir(self.trace) if f.endswith('.npy'))
+		positions, names = self._select(header)
+		# Memory-mapped: only the blocks being replayed are read
+		columns = [numpy.load(os.path.join(self.trace, header[p]+'.npy'), mmap_mode = 'r') for p in positions]
+		length = len(columns[0])
+		assert all(len(c) == length for c in columns)
+		def rows():
+			for i in range(0, length, self.block):
+				yield from zip(*(c[i:i+self.block].tolist() for c in columns))
+		return names, rows()
+
+
+# Do NOT remove
+resource = lambda *args: Trace(*args)
@@ -2,6 +2,7 @@
 SimPype's pipe.
 
 """
+import functools
 import inspect
 import simpy
 import types
@@ -65,6 +66,7 @@ def enqueue(arg):
 	if isinstance(arg, Pipe):
 		pipe = arg
 		def decorator(func):
+			@functools.wraps(func)
 			def wrapper(pipe, message):
 				return __enqueue(func, pipe, message)
 			pipe.enqueue = types.MethodType(wrapper, pipe)
@@ -72,6 +74,7 @@ def enqueue(arg):
 		return decorator
 	else:
 		func = arg
+		@functools.wraps(func)
 		def wrapper(pipe, message):
 			return __enqueue(func, pipe, message)
 		return wrapper
@@ -112,6 +115,7 @@ def dequeue(arg):
 	if isinstance(arg, Pipe):
 		pipe = arg
 		def decorator(func):
+			@functools.wraps(func)
 			def wrapper(pipe):
 				return __dequeue(func, pipe)
 			pipe.dequeue = types.MethodType(wrapper, pipe)
@@ -119,6 +123,7 @@ def dequeue(arg):
 		return decorator
 	else:
 		func = arg
+		@functools.wraps(func)
 		def wrapper(pipe):
 			return __dequeue(func, pipe)
 		return wrapper
@@ -144,10 +149,14 @@ class Pipe:
 			The pipe id.
 		resource (:class:`~simpype.resource.Resource`):
 			The resource the pipe is associated to.
-		available (simpy.events.Event):
-			Event signaling the presence of a :class:`~simpype.message.Message` in the pipe.
+		available (bool):
+			``True`` if a :class:`~simpype.message.Message` may be waiting in the pipe.
 		queue (dict):
 			The dictionary storing the :class:`~simpype.queue.Queue` instances associated to this pipe.
+		ready (int):
+			The number of active queues storing at least a :class:`~simpype.message.Message`.
+		occupancy (int):
+			The sum of the occupancy of the queues associated to this pipe.
 
 	"""
 	def __init__(self, sim, resource, id):
@@ -157,11 +166,20 @@ class Pipe:
 		self.env = sim.env
 		self.id = id
 		self.resource = resource
-		self.available = self.env.event()
+		self.available = False
 		self.queue = {}
+		self.ready = 0
+		self.occupancy = 0
+		# The queues overloading __len__, checked one by one
+		self._custom = []
 		self.log = True
+		self._batch = False
 		# Init
-		self.a_wait_loop = self.env.process(self._wait_loop())
+		if self.sim.engine == 'process':
+			self.a_wait_loop = self.env.process(self._wait_loop())
+		else:
+			self.a_wait_loop = None
+			self.resource.slots.wait(self._dispatch)
 
 	@property
 	def log(self):
@@ -180,18 +198,84 @@ class Pipe:
 		assert message.location == self
 
 	def _wait_loop(self):
+		slots = self.resource.slots
 		while True:
-			yield self.resource.available & self.available
-			self.available = self.env.event()
-			self.resource.free()
+			while not (slots.free and self.available):
+				yield slots.wait()
+			self.available = False
+			slots.acquire()
 			message = yield self.env.process(self.dequeue())
 			if isinstance(message, simpype.Message):
 				self.env.process(self._service(message))
+			else:
+				slots.release()
 			self.full()
 
 	def _service(self, message):
 		yield self.env.process(self.resource.service(message))
-		self.resource.free()
+		self.resource.slots.release()
+
+	def _put(self, message):
+		""" Enqueue ``message`` without a process unless the enqueue hook is a generator """
+		func = getattr(self.enqueue, '__wrapped__', None)
+		if func is None or inspect.isgeneratorfunction(func):
+			self.env.process(self.enqueue(message))
+		else:
+			message.location = self
+			message.resource = self.resource
+			func(self, message)
+			self.full()
+
+	def _bulk(self):
+		""" The enqueue hook if messages can be enqueued in bulk, i.e. if it does not yield, else ``None`` """
+		func = getattr(self.enqueue, '__wrapped__', None)
+		if func is None or inspect.isgeneratorfunction(func):
+			return None
+		return func
+
+	def _put_batch(self, messages):
+		""" Enqueue ``messages`` at once, checking if the pipe is full only after the last one """
+		func = self._bulk()
+		self._batch = True
+		try:
+			for message in messages:
+				message.location = self
+				message.resource = self.resource
+				func(self, message)
+		finally:
+			self._batch = False
+		self.full()
+
+	def _enqueue_batch(self, messages):
+		""" The process enqueueing ``messages`` at once, for the process engine """
+		self._put_batch(messages)
+		yield from ()
+
+	def _dispatch(self, event = None):
+		""" The callback counterpart of :meth:`_wait_loop` """
+		slots = self.resource.slots
+		while slots.free and self.available:
+			self.available = False
+			slots.acquire()
+			func = getattr(self.dequeue, '__wrapped__', None)
+			if func is None or inspect.isgeneratorfunction(func):
+				# Dequeue hooks that yield are driven by a process
+				a_dequeue = self.env.process(self.dequeue())
+				a_dequeue.callbacks.append(self._dequeued)
+				return
+			self._start(func(self))
+		slots.wait(self._dispatch)
+
+	def _dequeued(self, event):
+		self._start(event.value)
+		self._dispatch()
+
+	def _start(self, message):
+		if isinstance(message, simpype.Message):
+			self.resource._serve(message)
+		else:
+			self.resource.slots.release()
+		self.full()
 
 	def add_queue(self, id, model = None):
 		""" Add a new queue to the pipe.
@@ -208,17 +292,27 @@ class Pipe:
 		"""
 		queue = simpype.build.queue(self.sim, self, id, model)
 		self.queue[queue.id] = queue
+		# Such queues may store their messages outside of the buffer, e.g. in a list of their own
+		if type(queue).__len__ is not simpype.Queue.__len__:
+			self._custom.append(queue)
 		return self.queue[queue.id]
 
 	def full(self):
 		""" Check if there is at least a :class:`~simpype.message.Message` in the pipe.
 
+		The active queues storing messages in their buffer are counted by ``ready``.
+		The queues overloading ``__len__`` are checked one by one instead, as before ``ready`` was introduced.
+
 		Returns:
 			bool
 
 		"""
-		tot = sum([len(q) for q in self.queue.values() if q.active.triggered])
-		if not self.available.triggered and tot > 0:
-			self.available.succeed()
+		if not self.available and (self.ready > 0 or self._custom and self._waiting()):
+			self.available = True
+			self.resource.slots.notify()
 			return True
 		return False
+
+	def _waiting(self):
+		""" ``True`` if an active queue overloading ``__len__`` is not empty """
+		return any(q.active.triggered and len(q) > 0 for q in self._custom)
@@ -1,12 +1,21 @@
 """
 SimPype's pipeline.
 
+A pipeline is compiled into an immutable routing table the first time a message looks up its next resources,
+and it is compiled again only after being modified through :meth:`Pipeline.add_pipe` or :meth:`Pipeline.merge_pipe`.
+
 """
 
+import types
+
 import simpype.resource
 import simpype.simulation
 
 
+# The read-only next mapping of the resources without successors
+EMPTY = types.MappingProxyType({})
+
+
 class Pipeline:
 	""" The pipeline connecting the various :class:`~simpype.resource.Resource` instances.
 
@@ -29,6 +38,16 @@ class Pipeline:
 			The first resource of the pipeline.
 		last (:class:`~simpype.resource.Resource`):
 			The last resource of the pipeline.
+		index (dict):
+			The integer index of each resource id, set by :meth:`compile`.
+		node (tuple):
+			The resources of the pipeline ordered by index, set by :meth:`compile`.
+		successor (tuple):
+			The tuple of the successor indices of each resource, ordered by index, set by :meth:`compile`.
+		unreachable (tuple):
+			The resources that no message can reach from the generators, set by :meth:`compile`.
+		cycle (tuple):
+			The resources belonging to a cycle of the pipeline, set by :meth:`compile`.
 
 	"""
 	def __init__(self, sim, id):
@@ -39,6 +58,104 @@ class Pipeline:
 		self.resource = {}
 		self.first = None
 		self.last = None
+		self.index = {}
+		self.node = ()
+		self.successor = ()
+		self.unreachable = ()
+		self.cycle = ()
+		self._routes = None
+
+	@property
+	def routes(self):
+		""" The dictionary mapping each resource id to the read-only next adjency list of the resource. """
+		if self._routes is None:
+			self.compile()
+		return self._routes
+
+	def compile(self, strict = False):
+		""" Compile the pipeline into an immutable routing table.
+
+		Every resource is assigned an integer index, and the successors of every resource are frozen into
+		a tuple of indices and into a read-only next mapping shared by all the messages.
+		The topology is checked as well: resources not reachable from the generators (or from the first resource)
+		are reported in ``unreachable``, and resources belonging to a cycle are reported in ``cycle``.
+
+		Args:
+			strict (bool, optional):
+				If True, raise a ``ValueError`` if the pipeline has unreachable resources or cycles
+
+		Returns:
+			:class:`Pipeline`
+
+		"""
+		index = {}
+		node = []
+		for id, value in self.resource.items():
+			for r in [self.sim.resource[id]] + value:
+				if r.id not in index:
+					index[r.id] = len(node)
+					node.append(r)
+		successor = [()] * len(node)
+		routes = {}
+		for id, value in self.resource.items():
+			successor[index[id]] = tuple(index[r.id] for r in value)
+			routes[id] = types.MappingProxyType({r.id: r for r in value}) if value else EMPTY
+		self.index = index
+		self.node = tuple(node)
+		self.successor = tuple(successor)
+		self._routes = routes
+		self._check(strict)
+		return self
+
+	def _check(self, strict):
+		""" Look for unreachable resources and cycles in the compiled pipeline """
+		root = [i for i,r in enumerate(self.node) if r.id in self.sim.generator]
+		if self.first is not None and self.first.id in self.index:
+			root.append(self.index[self.first.id])
+		if not root:
+			# Without generators, every resource without predecessors is a root
+			target = set([j for s in self.successor for j in s])
+			root = [i for i in range(len(self.node)) if i not in target]
+		# Iterative depth-first visit: 0 not visited, 1 on the stack, 2 done
+		state = [0] * len(self.node)
+		cycle = set()
+		for r in root:
+			if state[r]:
+				continue
+			state[r] = 1
+			stack = [(r, iter(self.successor[r]))]
+			while stack:
+				i, it = stack[-1]
+				j = next(it, None)
+				if j is None:
+					state[i] = 2
+					stack.pop()
+				elif state[j] == 0:
+					state[j] = 1
+					stack.append((j, iter(self.successor[j])))
+				elif state[j] == 1:
+					# Back edge: the stack from j to i is a cycle
+					k = [s[0] for s in stack].index(j)
+					cycle.update(s[0] for s in stack[k:])
+		self.unreachable = tuple(self.node[i] for i in range(len(self.node)) if state[i] == 0)
+		self.cycle = tuple(self.node[i] for i in sorted(cycle))
+		if strict and self.unreachable:
+			raise ValueError("Pipeline %s: unreachable resources %s" % (self.id, [r.id for r in self.unreachable]))
+		if strict and self.cycle:
+			raise ValueError("Pipeline %s: cycle through resources %s" % (self.id, [r.id for r in self.cycle]))
+
+	def route(self, resource):
+		""" The read-only next adjency list of ``resource`` in this pipeline.
+
+		Args:
+			resource (:class:`~simpype.resource.Resource`):
+				The resource to look up.
+
+		Returns:
+			mapping of resource id to :class:`~simpype.resource.Resource`
+
+		"""
+		return self.routes.get(resource.id, EMPTY)
 
 	def add_pipe(self, src, dst):
 		""" Add a pipe to the pipeline.
@@ -58,6 +175,7 @@ class Pipeline:
 		tsrc = src if isinstance(src, simpype.resource.Resource) else src.last
 		# Dst check
 		tdst = dst if isinstance(dst, simpype.resource.Resource) else dst.first
+		self._routes = None
 		# Create the list in the dictionary if does not exist
 		if tsrc.id not in self.resource:
 			self.resource[tsrc.id] = []
@@ -84,7 +202,14 @@ class Pipeline:
 
 		"""
 		assert isinstance(pipeline, Pipeline)
+		self._routes = None
 		for key, value in pipeline.resource.items():
 			if key not in self.resource:
 				self.resource[key] = []
-			self.resource[key] = self.resource[key] + list(set(value)-set(self.resource[key]))
+			# Append the missing resources in order, without rebuilding the list
+			current = self.resource[key]
+			known = set(current)
+			for r in value:
+				if r not in known:
+					current.append(r)
+					known.add(r)
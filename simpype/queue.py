@@ -2,6 +2,9 @@
 SimPype's queue.
 
 """
+import collections
+import collections.abc
+import itertools
 import types
 
 import simpype
@@ -13,7 +16,8 @@ def __push(func, queue, message):
 	message.location = queue
 	message.timestamp('pipe.in')
 	result = func(queue, message)
-	if isinstance(result, simpype.Message) and queue.active.triggered:
+	# A pipe enqueueing a batch checks if it is full once the whole batch is enqueued
+	if isinstance(result, simpype.Message) and queue.active.triggered and not queue.pipe._batch:
 		queue.pipe.full()
 	return result
 
@@ -22,7 +26,6 @@ def __pop(func, queue):
 	message = func(queue)
 	if isinstance(message, simpype.Message):
 		message.timestamp('pipe.out')
-		message.queue = None
 	return message
 
 def push(arg):
@@ -118,6 +121,232 @@ def pop(arg):
 		return wrapper
 
 
+class Buffer(collections.abc.MutableSequence):
+	""" Buffer is the data structure used by :class:`Queue` to physically store :class:`~simpype.message.Message` objects.
+
+	Buffer is a mutable sequence supporting the operations of a list, and it compares equal to a list storing the same messages.
+	Appending and popping at both ends, accessing the messages at both ends, checking the presence of a message,
+	counting its occurrences, and removing its first occurrence take constant time.
+	Accessing, replacing, or popping any other index, inserting in the middle, finding the index of a message,
+	sorting, reversing, and copying take linear time or more.
+
+	.. code-block:: python
+
+		buffer = simpype.queue.Buffer()
+		buffer.append(message)
+		if message in buffer:
+			buffer.remove(message)
+		message = buffer.pop(0)
+		buffer.sort(key = lambda m: m.property['priority'].value)
+
+	Args:
+		iterable (iterable, optional):
+			The messages initially stored in the buffer.
+		queue (:class:`Queue`, optional):
+			The queue notified of every message entering or leaving the buffer.
+
+	Attributes:
+		queue (:class:`Queue`):
+			The queue notified of every message entering or leaving the buffer.
+
+	"""
+	def __init__(self, iterable = (), queue = None):
+		# Each stored element is identified by a token growing from the head to the tail of the buffer
+		self._item = collections.OrderedDict()
+		# The token(s) of each stored message, in buffer order
+		self._token = {}
+		self._head = 0
+		self._tail = 0
+		self.queue = queue
+		self.extend(iterable)
+
+	def _link(self, message, token, left):
+		tokens = self._token.get(message)
+		if tokens is None:
+			self._token[message] = token
+		elif isinstance(tokens, list):
+			if left:
+				tokens.insert(0, token)
+			else:
+				tokens.append(token)
+		else:
+			self._token[message] = [token, tokens] if left else [tokens, token]
+		if self.queue is not None:
+			self.queue._enter(message)
+
+	def _unlink(self, message, token):
+		tokens = self._token[message]
+		if isinstance(tokens, list):
+			tokens.remove(token)
+			if len(tokens) == 1:
+				self._token[message] = tokens[0]
+		else:
+			del self._token[message]
+		if self.queue is not None:
+			self.queue._leave(message)
+
+	def _index(self, index):
+		size = len(self._item)
+		if index < 0:
+			index = index + size
+		if index < 0 or index >= size:
+			raise IndexError('buffer index out of range')
+		return index
+
+	def _rebuild(self, messages, left = (), entered = ()):
+		""" Store ``messages`` in place of the buffered ones, then notify the queue of the messages that left and entered """
+		queue, self.queue = self.queue, None
+		self._item.clear()
+		self._token.clear()
+		self._head = 0
+		self._tail = 0
+		self.extend(messages)
+		self.queue = queue
+		if queue is not None:
+			for message in left:
+				queue._leave(message)
+			for message in entered:
+				queue._enter(message)
+
+	def append(self, message):
+		""" Append ``message`` to the tail of the buffer. """
+		self._tail = self._tail + 1
+		self._item[self._tail] = message
+		self._link(message, self._tail, False)
+
+	def appendleft(self, message):
+		""" Append ``message`` to the head of the buffer. """
+		self._item[self._head] = message
+		self._item.move_to_end(self._head, last = False)
+		self._link(message, self._head, True)
+		self._head = self._head - 1
+
+	def insert(self, index, message):
+		""" Insert ``message`` before position ``index``. """
+		size = len(self._item)
+		if index < 0:
+			index = max(index + size, 0)
+		if index == 0:
+			self.appendleft(message)
+		elif index >= size:
+			self.append(message)
+		else:
+			messages = list(self)
+			messages.insert(index, message)
+			self._rebuild(messages, entered = [message])
+
+	def extend(self, iterable):
+		""" Append the messages of ``iterable`` to the tail of the buffer. """
+		for message in iterable:
+			self.append(message)
+
+	def clear(self):
+		""" Remove all the messages from the buffer. """
+		while self._item:
+			self.pop()
+
+	def pop(self, index = -1):
+		""" Remove and return the message at position ``index`` (default last). """
+		index = self._index(index)
+		if index == 0 or index == len(self._item)-1:
+			token, message = self._item.popitem(last = index != 0)
+		else:
+			token = next(itertools.islice(self._item, index, None))
+			message = self._item.pop(token)
+		self._unlink(message, token)
+		return message
+
+	def popleft(self):
+		""" Remove and return the message at the head of the buffer. """
+		return self.pop(0)
+
+	def remove(self, message):
+		""" Remove the first occurrence of ``message``. """
+		if message not in self._token:
+			raise ValueError('message not in buffer')
+		tokens = self._token[message]
+		token = tokens[0] if isinstance(tokens, list) else tokens
+		del self._item[token]
+		self._unlink(message, token)
+
+	def index(self, message, start = 0, stop = None):
+		""" Return the position of the first occurrence of ``message`` between ``start`` and ``stop``. """
+		if message in self._token:
+			start, stop, step = slice(start, stop).indices(len(self._item))
+			for i, m in enumerate(itertools.islice(self._item.values(), start, stop), start):
+				if m == message:
+					return i
+		raise ValueError('message not in buffer')
+
+	def count(self, message):
+		""" Return the number of occurrences of ``message``. """
+		tokens = self._token.get(message)
+		if tokens is None:
+			return 0
+		return len(tokens) if isinstance(tokens, list) else 1
+
+	def reverse(self):
+		""" Reverse the order of the messages in place. """
+		self._rebuild(list(reversed(self._item.values())))
+
+	def sort(self, key = None, reverse = False):
+		""" Sort the messages in place, as :meth:`list.sort` does. """
+		self._rebuild(sorted(self, key = key, reverse = reverse))
+
+	def copy(self):
+		""" Return a new buffer storing the same messages, not associated to any queue. """
+		return Buffer(self)
+
+	def __contains__(self, message):
+		return message in self._token
+
+	def __eq__(self, other):
+		if isinstance(other, (Buffer, list)):
+			return list(self) == list(other)
+		return NotImplemented
+
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return list(self)[index]
+		index = self._index(index)
+		if index == 0:
+			return next(iter(self._item.values()))
+		if index == len(self._item)-1:
+			return next(reversed(self._item.values()))
+		return next(itertools.islice(self._item.values(), index, None))
+
+	def __setitem__(self, index, message):
+		messages = list(self)
+		if isinstance(index, slice):
+			message = list(message)
+			left, entered = messages[index], message
+		else:
+			left, entered = [messages[index]], [message]
+		messages[index] = message
+		self._rebuild(messages, left, entered)
+
+	def __delitem__(self, index):
+		if isinstance(index, slice):
+			messages = list(self)
+			left = messages[index]
+			del messages[index]
+			self._rebuild(messages, left)
+		else:
+			self.pop(index)
+
+	def __iter__(self):
+		return iter(self._item.values())
+
+	def __len__(self):
+		return len(self._item)
+
+	def __repr__(self):
+		return 'Buffer(' + repr(list(self)) + ')'
+
+	def __reversed__(self):
+		return reversed(self._item.values())
+
+
 class Queue:
 	""" Queue is used by :class:`~simpype.pipe.Pipe` to store :class:`~simpype.message.Message` objects.
 
@@ -138,10 +367,13 @@ class Queue:
 			The queue id.
 		pipe (:class:`~simpype.pipe.Pipe`):
 			The pipe this queue is associated to.
-		buffer (list):
+		buffer (:class:`Buffer`):
 			The data structure physically storing the :class:`~simpype.message.Message` objects.
+			Assigning any other iterable converts it to a :class:`Buffer`.
 		capacity (int):
 			The capacity of the buffer. ``Infinite`` by default.
+		occupancy (int):
+			The sum of the :meth:`size` of the messages stored in the buffer.
 		active (simpy.events.Event):
 			Event signaling when the queue is active.
 
@@ -153,10 +385,27 @@ class Queue:
 		self.env = sim.env
 		self.id = id
 		self.pipe = pipe
-		self.buffer = []
+		self.occupancy = 0
+		self._ready = False
 		self.capacity = float('inf')
 		self.log = True
 		self.active = self.env.event().succeed()
+		self.buffer = Buffer()
+
+	@property
+	def buffer(self):
+		return self._buffer
+
+	@buffer.setter
+	def buffer(self, value):
+		if hasattr(self, '_buffer'):
+			self._buffer.queue = None
+			self.pipe.occupancy = self.pipe.occupancy - self.occupancy
+		self._buffer = value if isinstance(value, Buffer) else Buffer(value)
+		self._buffer.queue = self
+		self.occupancy = sum([self.size(m) for m in self._buffer])
+		self.pipe.occupancy = self.pipe.occupancy + self.occupancy
+		self._update()
 
 	@property
 	def log(self):
@@ -167,6 +416,25 @@ class Queue:
 		assert isinstance(value, bool)
 		self._log = value
 
+	def _enter(self, message):
+		size = self.size(message)
+		self.occupancy = self.occupancy + size
+		self.pipe.occupancy = self.pipe.occupancy + size
+		self._update()
+
+	def _leave(self, message):
+		size = self.size(message)
+		self.occupancy = self.occupancy - size
+		self.pipe.occupancy = self.pipe.occupancy - size
+		self._update()
+
+	def _update(self):
+		""" Update the number of active and non-empty queues of the pipe """
+		ready = self.active.triggered and len(self._buffer) > 0
+		if ready != self._ready:
+			self._ready = ready
+			self.pipe.ready = self.pipe.ready + (1 if ready else -1)
+
 	def _message_dropped(self, message, cause):
 		assert isinstance(message, simpype.Message)
 		assert message.location == self
@@ -178,11 +446,29 @@ class Queue:
 		""" Enable this queue by triggering the ``active`` attribute. """
 		if not self.active.triggered:
 			self.active.succeed()
+		self._update()
 		self.pipe.full()
 
 	def disable(self):
 		""" Disable this queue by resetting the ``active`` attribute. """
 		self.active = self.env.event()
+		self._update()
+
+	def size(self, message):
+		""" The occupancy of ``message`` in the queue, e.g. its length in bytes. 
+		
+		The default size is 1, that is the occupancy is the number of stored messages.
+		The size of a message must not change while it is stored in the queue.
+
+		Args:
+			message (:class:`~simpype.message.Message`):
+				The message to size.
+
+		Returns:
+			int
+
+		"""
+		return 1
 
 	def __len__(self):
-		return len(self.buffer)
+		return self.occupancy
@@ -13,6 +13,7 @@ Where each dictionary element is so defined:
 
 	* ``initial_time`` is the element key and must be of *int* or *float* type. It represents the initial simulation time at which the ``lambda_function`` is invoked;
 	* ``lambda_function`` is the element value. It is mandatory that for the value to be a *lambda* function. Such function must return a value, usually a *int* or a *float*;
+	  a :class:`~simpype.distribution.Distribution` object (e.g. ``Exponential(0.2)``) can be used instead, drawing its values from pre-sampled blocks;
 
 An example of random dictionary initialization is the following:
 
@@ -64,19 +65,117 @@ Produce a random value:
 	random_value = myrand.value    # random_value = 7.374759019459148
 
 """
+import bisect
+import copy
+import functools
+import hashlib
+import inspect
+import itertools
 import random
 
 import simpype
+import simpype.distribution
+
+
+def _none():
+	return None
+
+
+class _Antithetic(random.Random):
+	""" A python random number generator returning the complement of the uniform values """
+	def random(self):
+		return 1.0 - super().random()
+
+
+class Stream:
+	""" An independent stream of random numbers, derived from the simulation seed and the path of a component.
+
+	The seed of the stream is a hash of the simulation seed and of the path only, so that the values drawn by
+	a component do not depend on which other components exist nor on the order of the events.
+	Simulations sharing the seed therefore share their streams, i.e. they use common random numbers,
+	and the components of different scenarios can share a stream by using the same path, e.g. a logical name.
+	The state of the stream is reset whenever the simulation seed or :attr:`~simpype.simulation.Simulation.antithetic` change.
+
+	Args:
+		sim (:class:`Simulation`):
+			The SimPype simulation object.
+		path (str):
+			The path identifying the component, e.g. ``'resource.res0'``.
+
+	Attributes:
+		sim (:class:`Simulation`):
+			The SimPype simulation object.
+		path (str):
+			The path identifying the component.
+
+	"""
+	def __init__(self, sim, path):
+		assert isinstance(sim, simpype.Simulation)
+		self.sim = sim
+		self.path = path
+		self._random = None
+		self._numpy = None
+
+	@property
+	def seed(self):
+		""" The seed of the stream. """
+		digest = hashlib.sha256(repr((self.sim.seed, self.path)).encode()).digest()
+		return int.from_bytes(digest[:16], 'big')
+
+	@property
+	def antithetic(self):
+		""" True if the stream returns antithetic variates, see :attr:`~simpype.simulation.Simulation.antithetic`. """
+		return self.sim.antithetic
+
+	@property
+	def random(self):
+		""" The python random number generator (random.Random) of the stream.
+
+		In an antithetic stream, ``random()`` returns ``1 - u`` instead of ``u``, so that the methods sampling
+		by inversion, e.g. ``uniform``, ``expovariate``, ``weibullvariate`` or ``choices``, return antithetic variates.
+
+		"""
+		if self._random is None:
+			self._random = (_Antithetic if self.antithetic else random.Random)(self.seed)
+		return self._random
+
+	@property
+	def numpy(self):
+		""" The NumPy random number generator (PCG64) of the stream, ``None`` if NumPy is not installed. """
+		numpy = simpype.distribution.numpy
+		if self._numpy is None and numpy is not None:
+			self._numpy = numpy.random.Generator(numpy.random.PCG64(numpy.random.SeedSequence(self.seed)))
+		return self._numpy
+
+	def reset(self):
+		""" Reset the state of the stream, e.g. after the simulation seed changed. """
+		seed = self.seed
+		# In place, since the generators are referenced by the random variables
+		if self._random is not None:
+			self._random.__class__ = _Antithetic if self.antithetic else random.Random
+			self._random.seed(seed)
+		if self._numpy is not None:
+			numpy = simpype.distribution.numpy
+			self._numpy.bit_generator.state = numpy.random.PCG64(numpy.random.SeedSequence(seed)).state
 
 
 class Random:
 	""" SimPype's random class that may return different values depending on the simulation time.
 
+	The steps are compiled into an immutable tuple sorted by initial time, so that the same object can be
+	evaluated at any simulation time, e.g. across several runs. The step of the last evaluation is cached,
+	and the step of any other time is found by bisection.
+	The ``lambda`` functions are called only when a value is produced, never while compiling the steps.
+	Each step samples a copy of its :class:`~simpype.distribution.Distribution`, if any, from the stream of the variable,
+	so that a distribution can be shared by several variables without sharing their values, and is never modified.
+
 	Args:
 		sim (:class:`Simulation`):
 			The SimPype simulation object.
-		step_dict (dict):
-			The dictionary storing the random steps.
+		step_dict (dict, :class:`~simpype.distribution.Distribution`):
+			The dictionary storing the random steps, or a distribution holding from t=0 on.
+		stream (:class:`Stream`, str, optional):
+			The stream of the random variable, or the path of the stream, e.g. a logical name shared by several scenarios.
 
 	Attributes:
 		sim (:class:`Simulation`):
@@ -85,70 +184,133 @@ class Random:
 			The SimPy environment object.
 		step_dict (dict):
 			The dictionary storing the random steps.
-		step_list (list):
-			The list storing the sorted random steps.
+		step_list (tuple):
+			The tuple storing the sorted random steps.
+		breakpoints (tuple):
+			The sorted initial times of the random steps.
+		stream (:class:`Stream`):
+			The stream passed to the ``lambda`` functions taking an argument, and used by the distributions.
+			If ``None``, they draw from the python ``random`` module.
 	
 	"""
 	class Step:
-		def __init__(self, tfrom, tto, process):
+		__slots__ = ('tfrom', 'tto', 'process', 'distribution')
+
+		def __init__(self, tfrom, tto, process, distribution = None):
 			self.tfrom = tfrom
 			self.tto = tto
 			self.process = process
+			self.distribution = distribution
 
-	def __init__(self, sim, step_dict):
+	def __init__(self, sim, step_dict, stream = None):
 		assert isinstance(sim, simpype.Simulation)
+		if isinstance(stream, str):
+			stream = sim.stream(stream)
+		assert stream is None or isinstance(stream, Stream)
 		self.sim = sim
 		self.env = sim.env
-		self.step_dict = {}
-		self.step_list = []
+		self.stream = stream
 		# Init	
+		# A distribution alone holds from t=0 on
+		if isinstance(step_dict, simpype.distribution.Distribution):
+			step_dict = {0: step_dict}
 		for v in step_dict.values():
 			assert callable(v)
-
+		step_dict = dict(step_dict)
 		if 0 not in step_dict:
-			step_dict[0] = lambda: None
-		step_dict[float("inf")] = lambda: None
-		time_step = sorted(step_dict)
-
-		# Parse and build the steps
-		i = 0
-		while i < len(time_step)-1:
-			tfrom = time_step[i]
-
-			j = i+1
-			while j < len(time_step):
-				tto = time_step[j]
-				a = step_dict[time_step[i]]
-				b = step_dict[time_step[j]]
-
-				create = True
-				if a() is not None:
-					process = a
-					create = True
-					# break
-					i = i+1
-					j = float("inf")
-				elif a() is None and b() is not None:
-					wait = (tto - tfrom) + b()
-					process = lambda: wait
-					create = True
-					# break
-					i = j
-					j = float("inf")
-				elif a() is None and b() is None:
-					if j == len(time_step) - 1:
-						process = b
-						create = True
-						# break
-						i = float("inf")
-						j = float("inf")
-					else:
-						j = j+1
-					
-				if create:
-					s = self.Step(tfrom, tto, process)
-					self.step_list.append(s)
-					self.step_dict[s.tfrom] = s
+			step_dict[0] = _none
+		self.breakpoints = tuple(sorted(step_dict))
+		tto = self.breakpoints[1:] + (float("inf"),)
+		step_list = []
+		for i,t in enumerate(self.breakpoints):
+			f = step_dict[t]
+			distribution = None
+			if isinstance(f, simpype.distribution.Distribution):
+				f = distribution = self._bind(f)
+			step_list.append(self.Step(t, tto[i], self._process(f), distribution))
+		self.step_list = tuple(step_list)
+		self.step_dict = {s.tfrom: s for s in self.step_list}
+		self._index = 0
+		self._step_cache = self.step_list[0]
+
+	def _bind(self, distribution):
+		""" A copy of ``distribution`` sampling from its own stream, if set, or from the stream of the variable """
+		# The copy has the parameters of the distribution only, not its values nor its generator
+		clone = copy.copy(distribution)
+		clone.stream = distribution.stream if distribution.stream is not None else self.stream
+		clone._check()
+		return clone
+
+	def _process(self, f):
+		""" The function producing the values of a step """
+		# Distributions hand out their buffered values without any Python call
+		if isinstance(f, simpype.distribution.Distribution):
+			return f.draw
+		# Functions taking an argument draw from the stream
+		try:
+			parameters = inspect.signature(f).parameters.values()
+		except (TypeError, ValueError):
+			return f
+		if len([p for p in parameters if p.default is p.empty and p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD)]) == 1:
+			return functools.partial(f, self.stream.random if self.stream is not None else random)
+		return f
+
+	def _step(self, time):
+		""" The index of the step active at ``time`` """
+		i = self._index
+		step = self.step_list[i]
+		if step.tfrom <= time < step.tto:
+			return i
+		# Time usually moves forward by one step at most
+		if time >= step.tto and i+1 < len(self.step_list) and time < self.step_list[i+1].tto:
+			i = i+1
+		else:
+			i = max(bisect.bisect_right(self.breakpoints, time) - 1, 0)
+		self._index = i
+		self._step_cache = self.step_list[i]
+		return i
+
+	def _gap(self, i, time):
+		""" The value of a step returning ``None`` """
+		for step in self.step_list[i+1:]:
+			value = step.process()
+			if value is not None:
+				return (step.tfrom - time) + value
+		return None
+
+	def distribution(self, time):
+		""" Returns the distribution of the step active at the simulation time ``time``.
+
+		Args:
+			time (int, float):
+				The simulation time.
+
+		Returns:
+			:class:`~simpype.distribution.Distribution`, or ``None`` if the step is a ``lambda`` function.
+
+		"""
+		return self.step_list[self._step(time)].distribution
+
+	def at(self, time):
+		""" Returns a random value given the simulation time ``time``.
+
+		If the step active at ``time`` returns ``None``, the value is the time to wait until
+		the first following step returning a value, plus that value.
+		If no following step returns a value, the value is ``None``.
+
+		Args:
+			time (int, float):
+				The simulation time.
+
+		Returns:
+			Value as returned by the the ``lambda`` function.
+
+		"""
+		i = self._step(time)
+		value = self.step_list[i].process()
+		if value is None:
+			return self._gap(i, time)
+		return value
 
 	@property
 	def value(self):
@@ -158,31 +320,63 @@ class Random:
 			Value as returned by the the ``lambda`` function.
 			
 		"""
-		while self.step_list[0].tto <= self.env.now:
-			self.step_list.pop(0)
-		return self.step_list[0].process()
+		now = self.env.now
+		step = self._step_cache
+		# Fast path: the step of the previous value is still active
+		if not (step.tfrom <= now < step.tto):
+			step = self.step_list[self._step(now)]
+		value = step.process()
+		if value is None:
+			return self._gap(self._index, now)
+		return value
+
+	def sample(self, n):
+		""" Returns ``n`` random values given the current simulation time.
+
+		The values of a distribution are drawn at once, the ``lambda`` functions are called ``n`` times.
+
+		Args:
+			n (int):
+				The number of values.
+
+		Returns:
+			list
+
+		"""
+		distribution = self.step_list[self._step(self.env.now)].distribution
+		if distribution is not None:
+			return list(itertools.islice(distribution._values, n))
+		return [self.value for i in range(n)]
 
 
 class RandomDict(dict):
 	""" A custom dictionary storing :class:`Random` objects.
 
+	Each key has its own :class:`Stream` if the dictionary has a path.
+
 	Args:
 		sim (:class:`Simulation`):
 			The SimPype simulation object.
+		path (str, optional):
+			The path of the component owning the dictionary, e.g. ``'resource.res0'``.
 
 	Attributes:
 		sim (:class:`Simulation`):
 			The SimPype simulation object.
+		path (str):
+			The path of the component owning the dictionary.
 	
 	"""
-	def __init__(self, sim):
+	def __init__(self, sim, path = None):
 		assert isinstance(sim, simpype.Simulation)
 		super().__init__()
 		self.sim = sim
 		self.env = sim.env
+		self.path = path
 	
 	def __setitem__(self, key, value):
 		if isinstance(value, Random):
 			super().__setitem__(key, value)
 		else:
-			super().__setitem__(key, Random(self.sim, value))
+			stream = self.sim.stream(self.path + '.random.' + str(key)) if self.path is not None else None
+			super().__setitem__(key, Random(self.sim, value, stream))
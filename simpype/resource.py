@@ -29,6 +29,7 @@ See :ref:`resource` :func:`service` for more details on how to customize a :clas
    sim.run(until = 10)
 
 """
+import functools
 import inspect
 import simpy
 import types
@@ -37,12 +38,21 @@ import simpype
 import simpype.build
 
 
+def __wait(event):
+	return (yield event)
+
 def __service(func, resource, message):
 	assert isinstance(resource, Resource)
 	assert isinstance(message, simpype.Message)
 	message.location = resource
 	if inspect.isgeneratorfunction(func):
 		a_serve = resource.env.process(func(resource, message))
+	else:
+		a_serve = func(resource, message)
+	if isinstance(a_serve, simpy.Event):
+		if not isinstance(a_serve, simpy.events.Process):
+			# Wrap plain events into a process so that the task can be interrupted
+			a_serve = resource.env.process(__wait(a_serve))
 		task = resource.add_task(message, a_serve)
 		try:
 			yield a_serve
@@ -51,12 +61,8 @@ def __service(func, resource, message):
 			message.timestamp('resource.'+str(interrupt.cause))
 		resource.del_task(task)
 	else:
-		func(resource, message)
 		message.timestamp('resource.serve')
-	if message.next:
-		resource.send(message)
-	else:
-		message.done()
+	resource._forward(message)
 
 
 def service(arg):
@@ -89,11 +95,21 @@ def service(arg):
 			@simpype.resource.service
 			def service(self, message):
 				yield self.env.timeout(1.0)
+
+	A service that only waits for a single event does not need to be a generator: it can return the event instead.
+	With the ``callback`` engine (see :class:`~simpype.simulation.Simulation`), such services are served without spawning any SimPy process.
+
+	.. code-block:: python
+
+		@simpype.resource.service(myresource)
+		def service(self, message):
+			return self.env.timeout(1.0)
 	
 	"""
 	if isinstance(arg, simpype.Resource):
 		resource = arg
 		def decorator(func):
+			@functools.wraps(func)
 			def wrapper(resource, message):
 				return __service(func, resource, message)
 			resource.service = types.MethodType(wrapper, resource)
@@ -101,6 +117,7 @@ def service(arg):
 		return decorator
 	else:
 		func = arg
+		@functools.wraps(func)
 		def wrapper(resource, message):
 			return __service(func, resource, message)
 		return wrapper
@@ -130,6 +147,8 @@ class Task:
 			The simulation time this task was interrupted. ``None`` if active.
 		process (simpy.events.Process):
 			The SimPy process being executed
+		callback (callable):
+			In ``callback`` mode, the callback completing the task attached to a plain event. ``None`` otherwise.
 
 	"""
 	def __init__(self, sim, message, process):
@@ -142,12 +161,115 @@ class Task:
 		self.started = self.env.now
 		self.interrupted = None
 		self.process = process
+		self.callback = None
+
+	@property
+	def is_alive(self):
+		""" True while the task is being served, i.e. neither completed nor interrupted, with both engines. """
+		if self.interrupted is not None:
+			return False
+		if isinstance(self.process, simpy.events.Process):
+			return self.process.is_alive
+		# A plain event, e.g. a timeout, is triggered as soon as it is scheduled: it is over once processed
+		return not self.process.processed
 
 	def interrupt(self, cause = None):
-		self.process.interrupt(cause = cause)
+		if isinstance(self.process, simpy.events.Process):
+			self.process.interrupt(cause = cause)
+		else:
+			# Plain events cannot be interrupted: move the callback of this task over to a failed event,
+			# leaving those of the other tasks sharing the event in place
+			assert self.process.callbacks is not None and self.callback in self.process.callbacks
+			self.process.callbacks.remove(self.callback)
+			interruption = self.env.event()
+			interruption.callbacks.append(self.callback)
+			interruption.fail(simpy.Interrupt(cause))
 		self.interrupted = self.env.now
 
 
+class _Wakeup(simpy.Event):
+	""" A successful event that can be scheduled over and over again. """
+	def __init__(self, env):
+		super().__init__(env)
+		self._ok = True
+		self._value = None
+		self.callbacks = None
+
+
+class Capacity:
+	""" Semaphore-style counter tracking the slots of a :class:`Resource`.
+
+	The pipe of the resource acquires a slot before dequeuing a :class:`~simpype.message.Message` and
+	releases it once the message has been served. The capacity wakes up the waiting pipe loop whenever
+	a slot is free and a message is waiting in the pipe, reusing the very same event every time.
+
+	Args:
+		resource (:class:`Resource`):
+			The resource this capacity is associated to.
+		size (int):
+			The number of slots.
+
+	Attributes:
+		resource (:class:`Resource`):
+			The resource this capacity is associated to.
+		env (simpy.Environment):
+			The SimPy environment object.
+		size (int):
+			The number of slots.
+		used (int):
+			The number of slots currently in use.
+		waiting (bool):
+			``True`` if the pipe loop is waiting to be woken up.
+
+	"""
+	def __init__(self, resource, size):
+		assert isinstance(resource, Resource)
+		self.resource = resource
+		self.env = resource.env
+		self.size = size
+		self.used = 0
+		self.waiting = False
+		self._wakeup = _Wakeup(self.env)
+
+	@property
+	def free(self):
+		""" ``True`` if at least a slot is free. """
+		return self.used < self.size
+
+	def acquire(self):
+		""" Acquire a slot. """
+		assert self.used < self.size
+		self.used = self.used + 1
+
+	def release(self):
+		""" Release a slot and wake up the pipe loop if a message is waiting. """
+		assert self.used > 0
+		self.used = self.used - 1
+		self.notify()
+
+	def notify(self):
+		""" Wake up the pipe loop if it is waiting, a slot is free, and a message is waiting in the pipe. """
+		if self.waiting and self.used < self.size and self.resource.pipe.available:
+			self.waiting = False
+			self.env.schedule(self._wakeup)
+
+	def wait(self, callback = None):
+		""" Wait to be woken up by :meth:`notify`.
+
+		Args:
+			callback (callable, optional):
+				The function to call when woken up.
+
+		Returns:
+			simpy.Event
+
+		"""
+		assert not self.waiting
+		self.waiting = True
+		self._wakeup.callbacks = [] if callback is None else [callback]
+		return self._wakeup
+
+
 class Resource:
 	""" This class implements the :class:`Resource` object.
 
@@ -157,7 +279,7 @@ class Resource:
 		id (str):
 			The resource id.
 		capacity (int):
-			The simpy.Resource capacity.
+			The number of messages the resource can simultaneously serve.
 		pipe (:class:`Pipe`):
 			The SimPype pipe model associated to this resource.
 
@@ -168,12 +290,16 @@ class Resource:
 			The SimPy environment object.
 		id (str):
 			The simpype.Resource id.
-		use (simpy.Resource):
-			The SimPy resource object.
+		capacity (int):
+			The number of messages the resource can simultaneously serve.
+		slots (:class:`Capacity`):
+			The counter tracking the slots of the resource.
 		pipe (:class:`Pipe`):
 			The SimPype pipe object.
+		stream (:class:`~simpype.random.Stream`):
+			The stream of random numbers of the resource, e.g. for the ``lambda`` functions of a custom model.
 		random (:class:`RandomDict`):
-			The SimPype RandomDict object.
+			The SimPype RandomDict object. Each key has its own stream, derived from the resource id and the key.
 		task (dict):
 			The dictionary storing the task currenty being executed by the resource.
 
@@ -183,13 +309,28 @@ class Resource:
 		self.sim = sim
 		self.env = sim.env
 		self.id = id
-		self.capacity = capacity
-		self.available = self.env.event().succeed()
+		self.slots = Capacity(self, capacity)
 		self.pipe = simpype.build.pipe(self.sim, self, self.id, pipe)
-		self.random = simpype.random.RandomDict(self.sim)
+		self.stream = self.sim.stream('resource.' + str(self.id))
+		self.random = simpype.random.RandomDict(self.sim, 'resource.' + str(self.id))
 		self.task = {}
 		self.log = True
 
+	@property
+	def available(self):
+		""" ``True`` if the resource can serve a further message. """
+		return self.slots.free
+
+	@property
+	def capacity(self):
+		""" The number of messages the resource can simultaneously serve. """
+		return self.slots.size
+
+	@capacity.setter
+	def capacity(self, value):
+		self.slots.size = value
+		self.slots.notify()
+
 	@property
 	def log(self):
 		return self._log
@@ -207,13 +348,52 @@ class Resource:
 		assert tid in self.task
 		self.task[tid].interrupt(cause = cause)
 
-	def free(self):
-		if self.available.triggered:
-			if len(self.task)+1 >= self.capacity:
-				self.available = self.env.event()
+	def _serve(self, message):
+		""" Serve ``message`` through callbacks, spawning a process only if the service hook is a generator """
+		func = getattr(self.service, '__wrapped__', None)
+		if func is None:
+			# Undecorated service hooks are driven as in the process engine
+			event = self.env.process(self.service(message))
+			event.callbacks.append(lambda event: self.slots.release())
+			return
+		message.location = self
+		if inspect.isgeneratorfunction(func):
+			event = self.env.process(func(self, message))
+		else:
+			event = func(self, message)
+		if isinstance(event, simpy.Event):
+			task = self.add_task(message, event)
+			task.callback = functools.partial(self._served, task)
+			event.callbacks.append(task.callback)
+		else:
+			message.timestamp('resource.serve')
+			self._forward(message)
+			self.slots.release()
+
+	def _served(self, task, event):
+		""" Complete the service of a task started by :meth:`_serve` """
+		if event.ok:
+			cause = 'serve'
+		elif isinstance(event.value, simpy.Interrupt):
+			event.defused = True
+			cause = event.value.cause
+		else:
+			# Let SimPy raise the exception
+			return
+		message = task.message
+		message.timestamp('resource.'+str(cause))
+		self.del_task(task)
+		self._forward(message)
+		self.slots.release()
+
+	def _forward(self, message):
+		if message.next:
+			self.send(message)
 		else:
-			if len(self.task) < self.capacity:
-				self.available.succeed()
+			message.done()
+			# A preempted message has already been moved back to a queue
+			if message.location is self:
+				self.sim.pool.release(message)
 
 	def add_task(self, message, process):
 		t = Task(self.sim, message, process)
@@ -236,4 +416,39 @@ class Resource:
 		resource = list(message.next.values())
 		for i in range(0, len(resource)):
 			tmsg = message if i == (len(resource)-1) else message.copy()
-			self.env.process(resource[i].pipe.enqueue(tmsg))
+			if self.sim.engine == 'callback':
+				resource[i].pipe._put(tmsg)
+			else:
+				self.env.process(resource[i].pipe.enqueue(tmsg))
+
+	def send_batch(self, messages):
+		""" Send several :class:`~simpype.message.Message` objects at once, e.g. a batch arrival.
+
+		The messages are enqueued in bulk by every next pipe, which checks if it is full only once per batch.
+		If the enqueue hook of a next pipe yields, the messages are sent one by one.
+
+		Args:
+			messages (list of :class:`~simpype.message.Message`):
+				The messages to send.
+
+		"""
+		assert all(isinstance(message, simpype.Message) for message in messages)
+		# The messages of a batch usually share their compiled route
+		routes = {id(message.next): message.next for message in messages}.values()
+		# The batches are enqueued in the order their pipes are first reached
+		pipes = {id(resource.pipe): resource.pipe for route in routes for resource in route.values()}.values()
+		if any(pipe._bulk() is None for pipe in pipes):
+			for message in messages:
+				self.send(message)
+			return
+		batch = {pipe: [] for pipe in pipes}
+		for message in messages:
+			resource = list(message.next.values())
+			for i in range(0, len(resource)):
+				tmsg = message if i == (len(resource)-1) else message.copy()
+				batch[resource[i].pipe].append(tmsg)
+		for pipe, batched in batch.items():
+			if self.sim.engine == 'callback':
+				pipe._put_batch(batched)
+			else:
+				self.env.process(pipe._enqueue_batch(batched))
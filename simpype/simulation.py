@@ -125,6 +125,7 @@ The log directory structure is the following:
 import copy
 import datetime
 import functools
+import hashlib
 import inspect
 import os
 import random
@@ -134,6 +135,8 @@ import time
 
 import simpype
 import simpype.build
+import simpype.log
+import simpype.timer
 
 
 class Model:
@@ -184,6 +187,23 @@ class Log:
 			Write the logs to a file if ``True``. Default value is ``True``.
 		print(bool):
 			Print the logs to the console if ``True``. Default value is ``False``.
+		format (str):
+			The format of the log file, either ``'csv'`` for ``sim.log`` or ``'binary'`` for ``sim.bin``,
+			see :mod:`simpype.log`. Default value is ``'csv'``.
+		thread (bool):
+			Write the log file from a background thread if ``True``, the entries being handed to the thread
+			in chunks through a bounded queue. Default value is ``False``.
+		chunk (int):
+			The number of log entries written to the log file at once. Default value is ``65536``.
+		sync (bool):
+			Sync the log file to the disk at the end of every run if ``True``, otherwise the file is only flushed and closed.
+			Default value is ``False``.
+		intern (bool):
+			Log the message ids, the resource ids and the event descriptions of ``sim.log`` as integer codes if ``True``.
+			The codes are listed in ``sim.cfg``. Default value is ``False``.
+		sample (float):
+			The fraction of the messages logged, sampled by sequence number so that all the events of a message are kept together.
+			Default value is ``1.0``.
 
 	"""
 	def __init__(self, sim):
@@ -194,9 +214,29 @@ class Log:
 		self.dir = os.path.join(os.getcwd(), 'log')
 		self.file = True
 		self.print = False
+		self.format = 'csv'
+		self.thread = False
+		self.chunk = 65536
+		self.sync = False
+		self.intern = False
+		self._writer = None
+		self._log = None
+		# The filter of the log entries, None to log them all
+		self._filter = None
+		self._include = {'resource': None, 'event': None, 'message': None}
+		self._exclude = {'resource': set(), 'event': set(), 'message': set()}
+		self._sample = 1.0
+		self._thread = None
+		self._rows = []
 		self._h_fixed = ["timestamp", "message", "seq_num", "resource", "event"]
 		self._h_property = []
+		self._compile_properties()
 		self._first = True
+		# The codes of the interned strings, and the number of codes already listed in sim.cfg
+		self._code = {}
+		self._listed = 0
+		for event in ('pipe.in', 'pipe.out', 'resource.serve'):
+			self._intern(event)
 
 	@property
 	def dir(self):
@@ -207,21 +247,169 @@ class Log:
 	def dir(self, val):
 		self._dir = functools.reduce(os.path.join,[val, self.sim.id, self.date.strftime("%Y%m%d.%H%M%S.%f")])
 
+	@property
+	def sample(self):
+		""" The fraction of the messages logged. """
+		return self._sample
+
+	@sample.setter
+	def sample(self, val):
+		assert 0 <= val <= 1
+		self._sample = val
+		self._compile()
+
+	@staticmethod
+	def _values(values):
+		""" The set of the values passed to :meth:`include` and :meth:`exclude` """
+		return {values} if isinstance(values, str) else set(values)
+
+	def include(self, resource = None, event = None, message = None):
+		""" Log only the entries of the given resources, events and messages.
+
+		Each call adds to the values already included. A ``None`` argument leaves the filter unchanged.
+
+		Args:
+			resource (str, list, optional):
+				The ids of the resources
+			event (str, list, optional):
+				The event descriptions, e.g. ``'resource.serve'``
+			message (str, list, optional):
+				The ids of the messages
+
+		"""
+		for key, values in (('resource', resource), ('event', event), ('message', message)):
+			if values is not None:
+				self._include[key] = (self._include[key] or set()) | self._values(values)
+		self._compile()
+
+	def exclude(self, resource = None, event = None, message = None):
+		""" Do not log the entries of the given resources, events and messages.
+
+		Args:
+			resource (str, list, optional):
+				The ids of the resources
+			event (str, list, optional):
+				The event descriptions, e.g. ``'pipe.in'``
+			message (str, list, optional):
+				The ids of the messages
+
+		"""
+		for key, values in (('resource', resource), ('event', event), ('message', message)):
+			if values is not None:
+				self._exclude[key] |= self._values(values)
+		self._compile()
+
+	def _compile(self):
+		""" Compile the filter checked by :meth:`~simpype.message.Message.timestamp` before creating a timestamp """
+		include, exclude = self._include, self._exclude
+		if all(v is None for v in include.values()) and not any(exclude.values()) and self._sample >= 1:
+			self._filter = None
+			return
+		# Sets of the accepted and of the rejected values, None if not filtered
+		r_in, e_in, m_in = include['resource'], include['event'], include['message']
+		r_out, e_out, m_out = (exclude[k] or None for k in ('resource', 'event', 'message'))
+		# Fibonacci hashing spreads the consecutive sequence numbers over the 64-bit range, after mixing them
+		# with a key of the message id, so that the generators numbering their messages alike aren't sampled alike
+		threshold = int(self._sample * (1 << 64)) if self._sample < 1 else None
+		keys = {}
+		def key(id):
+			k = keys.get(id)
+			if k is None:
+				k = keys[id] = int.from_bytes(hashlib.sha256(str(id).encode()).digest()[:8], 'big')
+			return k
+		def accept(message, description):
+			if e_in is not None and description not in e_in:
+				return False
+			if e_out is not None and description in e_out:
+				return False
+			if r_in is not None or r_out is not None:
+				resource = message.resource.id
+				if (r_in is not None and resource not in r_in) or (r_out is not None and resource in r_out):
+					return False
+			if m_in is not None and message.id not in m_in:
+				return False
+			if m_out is not None and message.id in m_out:
+				return False
+			return threshold is None or ((message.seq_num ^ key(message.id)) * 0x9E3779B97F4A7C15) & 0xFFFFFFFFFFFFFFFF < threshold
+		self._filter = accept
+
+	def _intern(self, s):
+		""" The code of the string ``s``, already formatted """
+		code = self._code.get(s)
+		if code is None:
+			code = self._code[s] = str(len(self._code))
+		return code
+
+	def _write_codes(self):
+		""" List the codes interned since the last call in sim.cfg """
+		codes = list(self._code.items())
+		for s, code in codes[self._listed:]:
+			self._write_cfg("Log Code " + code + ": " + s)
+		self._listed = len(codes)
+
+	def _compile_properties(self):
+		""" Compile the formatter of the logged properties, returning the end of the CSV line of a message """
+		names = tuple(self._h_property)
+		if not names:
+			self._properties = lambda message: ""
+			return
+		missing = ",NA" * len(names)
+		def properties(message):
+			# Read only: the properties shared with a template are not copied, and the missing ones are not set
+			property = message._property
+			if property is None:
+				return missing
+			return "," + ",".join([str(p.value) if p is not None else 'NA' for p in map(property.get, names)])
+		self._properties = properties
+
+	def _row(self, timestamp):
+		""" The values of a log entry, taken before the message changes """
+		message = timestamp.message
+		property = self._properties(message)
+		if self.intern:
+			intern = self._intern
+			return timestamp.timestamp, intern(message.id), message.seq_num, intern(timestamp.resource.id), \
+				intern(timestamp.description), property
+		return timestamp.timestamp, message.id, message.seq_num, timestamp.resource.id, timestamp.description, property
+
+	@staticmethod
+	def _format(row):
+		""" The CSV line of a log entry """
+		timestamp, message, seq_num, resource, description, property = row
+		return "%.9f" % timestamp + "," + message + "," + str(seq_num) + "," + resource + "," + description + property
+
+	@staticmethod
+	def _write_rows(log, rows):
+		""" Format and write a batch of log entries, from the writer thread """
+		log.info("\n".join(r if isinstance(r, str) else Log._format(r) for r in rows))
+
+	def _hand(self):
+		""" Hand the buffered log entries to the writer thread """
+		rows, self._rows = self._rows, []
+		self._thread.put(self._write_rows, self._log, rows)
+
 	def _write_log(self, timestamp):
 		assert isinstance(timestamp, simpype.message.Timestamp)
-		s = ""
-		if self._first:
-			s = s + ",".join(self._h_fixed + self._h_property) + "\n"
-			self._first = False
-		s = s + "%.9f" % timestamp.timestamp + "," + timestamp.message.id + "," + \
-			str(timestamp.message.seq_num) + "," + timestamp.resource.id + "," + timestamp.description
-		for h in self._h_property:
-			if h not in timestamp.message.property:
-				timestamp.message.property[h] = 'NA'
-			p = timestamp.message.property[h]
-			p = "%.9f" % p if isinstance(p, float) else str(p.value)
-			s = s + "," + p
-		if self.file:
+		if self.file and self._writer is not None:
+			self._writer.write(timestamp)
+			if not self.print:
+				return
+		row = self._row(timestamp)
+		header = ",".join(self._h_fixed + self._h_property) if self._first else None
+		self._first = False
+		if self.file and self._writer is None and self._thread is not None:
+			# Formatted by the writer thread
+			if header is not None:
+				self._rows.append(header)
+			self._rows.append(row)
+			if len(self._rows) >= self.chunk:
+				self._hand()
+			if not self.print:
+				return
+		s = self._format(row)
+		if header is not None:
+			s = header + "\n" + s
+		if self.file and self._writer is None and self._thread is None:
 			self._log.info(s)
 		if self.print:
 			print(s)
@@ -234,12 +422,57 @@ class Log:
 
 	def init(self):
 		""" Initialize the log folder and the simulation loggers. """
+		assert self.format in ('csv', 'binary')
 		if self.file:
 			if not os.path.exists(self.dir):
 				os.makedirs(self.dir)
-			self._log = simpype.build.logger('log', os.path.join(self.dir, 'sim.log'))
+			if self.thread and self._thread is None:
+				self._thread = simpype.log.Worker()
+			if self.format == 'binary':
+				# Created once, the entries of the following runs are appended
+				if self._writer is None:
+					self._writer = simpype.log.Writer(os.path.join(self.dir, 'sim.bin'), self._h_property, self.chunk)
+				else:
+					self._writer.reopen()
+				self._writer.thread = self._thread
+				self._writer.sync = self.sync
+			elif self._log is None:
+				# Created once as well, the file being reopened in append mode by the following runs
+				self._log = simpype.build.logger('log', os.path.join(self.dir, 'sim.log'))
 			self._cfg = simpype.build.logger('cfg', os.path.join(self.dir, 'sim.cfg')) 
 
+	def _close(self):
+		""" Flush and close the CSV log file, reopened in append mode by the next entry """
+		for handler in self._log.handlers:
+			handler.flush()
+			if self.sync and handler.stream is not None:
+				os.fsync(handler.stream.fileno())
+			handler.close()
+			handler.mode = 'a'
+
+	def flush(self):
+		""" Write the buffered log entries to the log file, close it, and stop the writer thread.
+
+		The log file is synced to the disk if :attr:`sync` is ``True``, and reopened by the next run.
+
+		"""
+		try:
+			if self._writer is not None:
+				self._writer.close()
+			elif self._log is not None:
+				if self._rows:
+					self._hand()
+				if self._thread is not None:
+					self._thread.put(self._close)
+				else:
+					self._close()
+		finally:
+			if self._thread is not None:
+				thread, self._thread = self._thread, None
+				if self._writer is not None:
+					self._writer.thread = None
+				thread.close()
+
 	def write(self, entry):
 		""" Write a log entry.
 			
@@ -262,6 +495,7 @@ class Log:
 
 		"""
 		self._h_property.append(property)
+		self._compile_properties()
 
 
 class Simulation:
@@ -270,12 +504,21 @@ class Simulation:
 	Args:
 		id (str):
 			The simulation environment id.
+		engine (str):
+			The engine moving the messages through the simulation, either ``'process'`` or ``'callback'``.
+			The ``process`` engine drives every enqueue, dequeue, and service through a SimPy process.
+			The ``callback`` engine drives them through direct callbacks and scheduled events,
+			falling back to a SimPy process only for the hooks that are generators.
+			Both engines log the same events at the same simulation times,
+			but the events sharing a timestamp may be logged in a different order. Default value is ``'process'``.
 	
 	Attributes:
 		env (simpy.Environment):
 			The SimPy environment object.
 		id (str):
 			The simulation environment id.
+		engine (str):
+			The engine moving the messages through the simulation.
 		resource (dict):
 			The dictionary storing all the :class:`~simpype.resource.Resource` objects of the simulation.
 		generator (dict):
@@ -284,18 +527,28 @@ class Simulation:
 			The dictionary storing all the :class:`~simpype.pipeline.Pipeline` objects of the simulation.
 		log (:class:`Log`):
 			The log class storing the logging parameters.
+		pool (:class:`~simpype.message.Pool`):
+			The pool recycling the messages, disabled by default.
+		timer (:class:`~simpype.timer.Timer`):
+			The timer scheduling the deadlines of the messages, e.g. their lifetime.
 		model (:class:`Model`):
 			The model class storing the custom model parameters.
 
 	"""
-	def __init__(self, id):
+	def __init__(self, id, engine = 'process'):
+		assert engine in ('process', 'callback')
 		self.env = simpy.Environment()
 		self.id = id
+		self.engine = engine
 		self.resource = {}
 		self.generator = {}
 		self.pipeline = {}
+		self._streams = {}
+		self._antithetic = False
 		self.seed = hash(random.random())
 		self.log = Log(self)
+		self.pool = simpype.message.Pool(self)
+		self.timer = simpype.timer.Timer(self)
 		self.model = Model(self)
 
 	@property
@@ -307,6 +560,48 @@ class Simulation:
 	def seed(self, num):
 		self._seed = num
 		random.seed(num)
+		for stream in self._streams.values():
+			stream.reset()
+
+	@property
+	def antithetic(self):
+		""" If True, the streams of random numbers return antithetic variates.
+
+		Two simulations with the same seed, one of them antithetic, form an antithetic pair: the values drawn
+		from each stream are negatively correlated, so that the average of the pair has a lower variance.
+		Setting this attribute resets the streams, like :attr:`seed`: set it before adding the components,
+		since the distributions sample their values in advance.
+		The ``lambda`` functions without arguments, drawing from the python ``random`` module, are not affected.
+
+		"""
+		return self._antithetic
+
+	@antithetic.setter
+	def antithetic(self, value):
+		assert isinstance(value, bool)
+		self._antithetic = value
+		for stream in self._streams.values():
+			stream.reset()
+
+	def stream(self, path):
+		""" Get the independent stream of random numbers of a component.
+
+		The stream only depends on the simulation seed and on ``path``, e.g. ``'resource.res0'``,
+		so that its values are reproducible regardless of the other components of the simulation.
+
+		Args:
+			path (str):
+				The path identifying the component
+
+		Returns:
+			:class:`~simpype.random.Stream`
+
+		"""
+		stream = self._streams.get(path)
+		if stream is None:
+			stream = simpype.random.Stream(self, path)
+			self._streams[path] = stream
+		return stream
 
 	def _update_message(self, pipeline):
 		# Add the pipeline to the messages in the new pipeline
@@ -332,6 +627,7 @@ class Simulation:
 		generator = simpype.build.generator(self, id, model)
 		self.generator[generator.id] = generator
 		self.resource[generator.id] = generator
+		self.log._intern(generator.id)
 		return generator
 
 	def add_pipeline(self, *args):
@@ -375,6 +671,7 @@ class Simulation:
 		assert id not in self.resource
 		resource = simpype.build.resource(self, id, model, capacity, pipe)
 		self.resource[resource.id] = resource
+		self.log._intern(resource.id)
 		return resource
 
 	def merge_pipeline(self, *args):
@@ -401,9 +698,18 @@ class Simulation:
 		""" Run the simulation environment using SimPy environment. """
 		self.log.init()
 		sptime = time.process_time()
-		self.env.run(*args, **kwargs)
+		try:
+			self.env.run(*args, **kwargs)
+		finally:
+			# The entries logged so far are written even if the simulation fails
+			self.log.flush()
+		# Including the log entries still being written by the thread
 		eptime = time.process_time()
 		# Save some simulation parameters
 		self.log.write("Simulation Seed: "+ str(self.seed))
 		self.log.write("Simulation Time: " + "%.9f" % self.env.now)
 		self.log.write("Execution Time: " + "%.9f" % (eptime - sptime))
+		if self.pool.enabled:
+			self.log.write("Message Pool: hit %d, miss %d, released %d" % (self.pool.hit, self.pool.miss, self.pool.released))
+		if self.log.intern:
+			self.log._write_codes()
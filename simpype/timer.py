@@ -0,0 +1,196 @@
+"""
+SimPype's timer.
+
+The timer of a simulation schedules the deadlines of the messages, e.g. their lifetime,
+without creating a SimPy event nor a process for every deadline.
+The deadlines are stored in a heap driven by a single pending SimPy event, and a cancelled deadline
+is just flagged and removed lazily, so that cancelling a deadline takes constant time.
+
+.. code-block :: python
+
+	# Drop the message after 10s, unless it is unsubscribed before
+	message.drop('lifetime', sim.timer.timeout(10.0, 'expired'))
+	# Cancel the deadline, e.g. once the message has been served
+	message.unsubscribe('lifetime')
+
+"""
+
+import heapq
+import itertools
+
+import simpype
+
+
+class Deadline:
+	""" This class implements a deadline scheduled by the :class:`Timer`.
+
+	A deadline can be used in place of a simpy.Event by :meth:`~simpype.message.Message.subscribe`
+	and :meth:`~simpype.message.Message.drop`, in which case it also acts as the subscription.
+	Each deadline serves a single subscription: subscribing it again schedules a new deadline at the same time.
+
+	Args:
+		timer (:class:`Timer`):
+			The timer scheduling the deadline
+		time (float):
+			The simulation time of the deadline
+		value (any):
+			The value passed to the callback
+
+	Attributes:
+		timer (:class:`Timer`):
+			The timer scheduling the deadline
+		time (float):
+			The simulation time of the deadline
+		value (any):
+			The value passed to the callback
+		message (:class:`~simpype.message.Message`):
+			The message subscribed to the deadline
+		callback (user-defined python function):
+			The python function to call upon expiration
+		id (str):
+			The subscription id
+		cancelled (bool):
+			True if the deadline has been cancelled
+		mode (str):
+			The subscription mode, always ``'callback'``
+
+	"""
+	mode = 'callback'
+	__slots__ = ('timer', 'time', 'value', 'message', 'callback', 'id', 'cancelled')
+
+	def __init__(self, timer, time, value):
+		self.timer = timer
+		self.time = time
+		self.value = value
+		self.message = None
+		self.callback = None
+		self.id = None
+		self.cancelled = False
+
+	@property
+	def event(self):
+		""" The deadline itself, for compatibility with :class:`~simpype.message.Subscription`. """
+		return self
+
+	def _expire(self):
+		message = self.message
+		self.message = None
+		if message is None:
+			return
+		if message._subscription.get(self.id) is self:
+			del message._subscription[self.id]
+		if message.is_alive:
+			self.callback(message, self.value)
+
+	def cancel(self):
+		""" Cancel the deadline and remove its subscription. """
+		if self.cancelled:
+			return
+		self.cancelled = True
+		message = self.message
+		self.message = None
+		if message is not None and message._subscription.get(self.id) is self:
+			del message._subscription[self.id]
+		self.timer._cancel(self)
+
+
+class Timer:
+	""" This class implements the timer scheduling the :class:`Deadline` objects of a simulation.
+
+	Args:
+		sim (:class:`~simpype.simulation.Simulation`):
+			The SimPype simulation object
+
+	Attributes:
+		sim (:class:`~simpype.simulation.Simulation`):
+			The SimPype simulation object
+		env (simpy.Environment):
+			The SimPy environment object
+
+	"""
+	def __init__(self, sim):
+		assert isinstance(sim, simpype.Simulation)
+		self.sim = sim
+		self.env = sim.env
+		self._heap = []
+		self._seq = itertools.count()
+		self._cancelled = 0
+		self._event = None
+		self._time = None
+
+	def __len__(self):
+		""" The number of pending deadlines. """
+		return len(self._heap) - self._cancelled
+
+	def at(self, time, value = None):
+		""" Schedule a deadline at the simulation time ``time``.
+
+		Args:
+			time (float):
+				The simulation time of the deadline
+			value (any, optional):
+				The value passed to the callback
+
+		Returns:
+			:class:`Deadline`
+
+		"""
+		assert time >= self.env.now
+		deadline = Deadline(self, time, value)
+		heapq.heappush(self._heap, (time, next(self._seq), deadline))
+		if self._event is None or time < self._time:
+			self._schedule(time)
+		return deadline
+
+	def timeout(self, delay, value = None):
+		""" Schedule a deadline ``delay`` after the current simulation time.
+
+		Args:
+			delay (float):
+				The delay of the deadline
+			value (any, optional):
+				The value passed to the callback
+
+		Returns:
+			:class:`Deadline`
+
+		"""
+		assert delay >= 0
+		return self.at(self.env.now + delay, value)
+
+	def _schedule(self, time):
+		""" Schedule the single SimPy event waking up the timer at ``time`` """
+		self._time = time
+		self._event = self.env.timeout(time - self.env.now)
+		self._event.callbacks.append(self._expire)
+
+	def _expire(self, event):
+		""" Expire all the deadlines due at the current simulation time """
+		# A wakeup replaced by an earlier one has nothing to do
+		if event is not self._event:
+			return
+		self._event = None
+		heap = self._heap
+		now = self.env.now
+		while heap and heap[0][0] <= now:
+			deadline = heapq.heappop(heap)[2]
+			if deadline.cancelled:
+				self._cancelled -= 1
+			else:
+				deadline.cancelled = True
+				deadline._expire()
+		while heap and heap[0][2].cancelled:
+			heapq.heappop(heap)
+			self._cancelled -= 1
+		# The callbacks may have scheduled a wakeup later than the earliest pending deadline
+		if heap and (self._event is None or heap[0][0] < self._time):
+			self._schedule(heap[0][0])
+
+	def _cancel(self, deadline):
+		""" Account a cancelled deadline, compacting the heap when it is mostly made of cancelled deadlines """
+		self._cancelled += 1
+		if self._cancelled > 64 and 2 * self._cancelled > len(self._heap):
+			# In place, since the heap may be being expired
+			self._heap[:] = [e for e in self._heap if not e[2].cancelled]
+			heapq.heapify(self._heap)
+			self._cancelled = 0
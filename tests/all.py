@@ -377,3 +377,92 @@ sim.run(until = 90)
 sim.log.file = False
 sim.log.print = False
 sim.run(until = 120)
+
+# Callback engine
+sim = simpype.Simulation(id = 'test.callback', engine = 'callback')
+sim.seed = 42
+sim.log.dir = '/tmp/log'
+sim.model.dir = 'examples/model'
+sim.log.property('items')
+
+# Gen00 -> Res00 (default service)
+cgen00 = sim.add_generator(id = 'gen00')
+cgen00.random['arrival'] = {0: lambda: 1.0}
+cgen00.random['quantity'] = {0: lambda: random.randint(1,3)}
+cres00 = sim.add_resource(id = 'res00', capacity = 2)
+cres00.random['service'] = {0: lambda: 1.5}
+cp00 = sim.add_pipeline(cgen00, cres00)
+
+# Gen01 -> Res01 (generator service and lifetime expiring during service)
+cgen01 = sim.add_generator(id = 'gen01')
+cgen01.random['arrival'] = {0: lambda: 1.0}
+cgen01.message.property['lifetime'] = {0: lambda: 2.0}
+cres01 = sim.add_resource(id = 'res01')
+cp01 = sim.add_pipeline(cgen01, cres01)
+
+@simpype.resource.service(cres01)
+def service(self, message):
+	yield self.env.timeout(3.0)
+
+# Gen02 -> Res02 (lifetime expiring during a plain event service)
+cgen02 = sim.add_generator(id = 'gen02')
+cgen02.random['arrival'] = {0: lambda: 1.0}
+cgen02.message.property['lifetime'] = {0: lambda: 2.5}
+cres02 = sim.add_resource(id = 'res02')
+cres02.random['service'] = {0: lambda: 3.0}
+cp02 = sim.add_pipeline(cgen02, cres02)
+
+# Gen03 -> Res03a |-> Res03b (routing in a non-generator service)
+#                 |-> Res03c
+cgen03 = sim.add_generator(id = 'gen03')
+cgen03.random['arrival'] = {0: lambda: 1.0}
+cres03a = sim.add_resource(id = 'res03a')
+cres03b = sim.add_resource(id = 'res03b')
+cres03c = sim.add_resource(id = 'res03c')
+cp03a = sim.add_pipeline(cgen03, cres03a, cres03b)
+cp03b = sim.add_pipeline(cres03a, cres03c)
+cp03 = sim.merge_pipeline(cp03a, cp03b)
+
+@simpype.resource.service(cres03a)
+def service(self, message):
+	message.next = cres03b if message.seq_num % 2 == 0 else cres03c
+
+# Gen04 -> Res04 (enqueue and dequeue hooks yielding)
+cgen04 = sim.add_generator(id = 'gen04')
+cgen04.random['arrival'] = {0: lambda: 1.0}
+cres04 = sim.add_resource(id = 'res04')
+cres04.random['service'] = {0: lambda: 1.0}
+cp04 = sim.add_pipeline(cgen04, cres04)
+
+@simpype.pipe.enqueue(cres04.pipe)
+def enqueue(self, message):
+	yield self.env.timeout(0)
+	return self.queue['default'].push(message)
+
+@simpype.pipe.dequeue(cres04.pipe)
+def dequeue(self):
+	yield self.env.timeout(0)
+	return self.queue['default'].pop()
+
+# Urgent, Normal -> Res05 (preemption)
+curgent = sim.add_generator(id = 'urgent')
+curgent.random['arrival'] = {0: lambda: 7.0}
+curgent.message.property['priority'] = 'urgent'
+curgent.message.property['items'] = {0: lambda: random.randint(1, 5)}
+cnormal = sim.add_generator(id = 'normal')
+cnormal.random['arrival'] = {0: lambda: 3.0}
+cnormal.message.property['priority'] = 'normal'
+cnormal.message.property['items'] = {0: lambda: random.randint(1, 5)}
+cres05 = sim.add_resource(id = 'res05', model = 'r_preemption', pipe = 'p_preemption')
+cp05a = sim.add_pipeline(curgent, cres05)
+cp05b = sim.add_pipeline(cnormal, cres05)
+
+# Gen06 -> Res06 (lifetimes expiring in the middle of the buffer)
+cgen06 = sim.add_generator(id = 'gen06')
+cgen06.random['arrival'] = {0: lambda: 0.5}
+cgen06.message.property['lifetime'] = {0: lambda: random.uniform(1.0, 10.0)}
+cres06 = sim.add_resource(id = 'res06')
+cres06.random['service'] = {0: lambda: 2.0}
+cp06 = sim.add_pipeline(cgen06, cres06)
+
+sim.run(until = 30)
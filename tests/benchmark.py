@@ -0,0 +1,138 @@
+import atexit
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+import simpype
+from simpype.distribution import Categorical, Exponential, Uniform
+
+from test_simpype import mm1
+
+
+def tempdir():
+	""" A temporary directory, removed at exit """
+	path = tempfile.mkdtemp()
+	atexit.register(shutil.rmtree, path, True)
+	return path
+
+
+# Memory footprint of the messages
+sim = simpype.Simulation(id = 'benchmark')
+gen = sim.add_generator(id = 'gen')
+res = sim.add_resource(id = 'res')
+p = sim.add_pipeline(gen, res)
+
+N = 10000
+tracemalloc.start()
+before = tracemalloc.take_snapshot()
+messages = [gen.gen_message() for i in range(N)]
+after = tracemalloc.take_snapshot()
+tracemalloc.stop()
+size = sum([s.size_diff for s in after.compare_to(before, 'filename')]) / N
+print("Message size: %.1f bytes (target: %d bytes)" % (size, simpype.message.MESSAGE_SIZE))
+assert size < simpype.message.MESSAGE_SIZE
+
+# Distributions hand out pre-sampled values
+def draws(f):
+	t = time.perf_counter()
+	for i in range(N): f()
+	return (time.perf_counter() - t) / N * 1e9
+N = 200000
+d = Exponential(0.5)
+l = lambda: random.expovariate(0.5)
+td, tl = draws(d.draw), draws(l)
+print("Distribution draw: %.1f ns (lambda: %.1f ns)" % (td, tl))
+# Through Random.value, as the resources and the generators draw
+sim = simpype.Simulation(id = 'benchmark.random')
+rd = simpype.Random(sim, Exponential(0.5), stream = 'distribution')
+rl = simpype.Random(sim, {0: l})
+td, tl = draws(lambda: rd.value), draws(lambda: rl.value)
+# 0.5 to 0.7 with NumPy; without NumPy, the blocks are sampled by the random module one value at a time
+print("Random value: %.1f ns (lambda: %.1f ns, ratio %.2f)" % (td, tl, td / tl))
+
+# Categorical draws in constant time through the alias table
+skus = ['sku%d' % i for i in range(500)]
+weights = [i % 7 + 1 for i in range(500)]
+c = Categorical(skus, weights)
+t = time.perf_counter()
+for i in range(N): c.draw()
+tc = time.perf_counter() - t
+t = time.perf_counter()
+for i in range(N // 10): random.choices(skus, weights)
+tr = (time.perf_counter() - t) * 10
+print("Categorical draw: %.1f ns (random.choices: %.1f ns)" % (tc / N * 1e9, tr / N * 1e9))
+
+# A non-homogeneous Poisson generator against hundreds of steps: both spend their time in the arrival events
+def arrivals(model):
+	sim = simpype.Simulation(id = 'benchmark.nhpp')
+	sim.seed = 3
+	gen = sim.add_generator(id = 'gen', model = model)
+	# A daily curve with 5-minute steps
+	curve = {300 * i: 1.0 + math.sin(math.pi * i / 288) for i in range(288)}
+	if model == 'nhpp':
+		gen.rate = curve
+	else:
+		gen.random['arrival'] = {t: (lambda r: lambda: random.expovariate(r))(r) for t, r in curve.items()}
+	gen.send = lambda message: None
+	t = time.perf_counter()
+	sim.env.run(until = 86400)
+	return time.perf_counter() - t
+print("NHPP generator: %.2f s (steps: %.2f s)" % (arrivals('nhpp'), arrivals(None)))
+
+# Batch arrivals are generated from the template at once and enqueued in bulk
+def unload(engine, quantity):
+	sim = simpype.Simulation(id = 'benchmark.batch', engine = engine)
+	sim.log.dir = tempdir()
+	gen = sim.add_generator(id = 'gen')
+	gen.random['arrival'] = {0: lambda: 0.5, 0.75: lambda: None}
+	gen.random['quantity'] = {0: lambda: quantity}
+	gen.message.property['weight'] = Uniform(5.0, 25.0)
+	res = sim.add_resource(id = 'res')
+	res.random['service'] = {0: lambda: 10.0}
+	sim.add_pipeline(gen, res)
+	t = time.perf_counter()
+	sim.run(until = 1.0)
+	return time.perf_counter() - t
+for engine in ('process', 'callback'):
+	print("Batch arrival of 500 messages (%s): %.1f ms" % (engine, unload(engine, 500) * 1e3))
+
+# The binary log is written faster than the CSV log, and both are written faster by a background thread
+def logged(format, thread = False):
+	sim, gen, res = mm1('benchmark.log', dir = tempdir())
+	sim.log.format = format
+	sim.log.thread = thread
+	sim.log.property('weight')
+	gen.message.property['weight'] = Uniform(5.0, 25.0)
+	t = time.perf_counter()
+	sim.run(until = 5000)
+	return sim, time.perf_counter() - t
+sim, tc = logged('csv')
+events = len(open(os.path.join(sim.log.dir, 'sim.log')).readlines()) - 1
+sim, tb = logged('binary')
+print("Log of %d events: csv %.1f ms, binary %.1f ms" % (events, tc * 1e3, tb * 1e3))
+sim, tc = logged('csv', True)
+sim, tb = logged('binary', True)
+print("Log in a thread: csv %.1f ms, binary %.1f ms" % (tc * 1e3, tb * 1e3))
+
+# The interned log is smaller
+def interned(intern):
+	sim, gen, res = mm1('benchmark.intern', dir = tempdir())
+	sim.log.intern = intern
+	sim.run(until = 5000)
+	return os.path.getsize(os.path.join(sim.log.dir, 'sim.log'))
+size = [interned(False), interned(True)]
+print("Interned log: %d bytes (strings: %d bytes)" % (size[1], size[0]))
+
+# Without logging, tracing an event allocates nothing
+sim = simpype.Simulation(id = 'benchmark.trace')
+sim.log.file = False
+gen = sim.add_generator(id = 'gen')
+message = gen.gen_message()
+t = time.perf_counter()
+for i in range(100000):
+	message.timestamp('pipe.in')
+print("Trace without logging: %.1f ns" % ((time.perf_counter() - t) * 1e4))
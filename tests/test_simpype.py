@@ -0,0 +1,852 @@
+"""
+SimPype's unit tests.
+
+Run them from the repository root with:
+
+.. code-block :: none
+
+	python -m unittest discover -s tests
+
+"""
+
+import collections
+import itertools
+import math
+import os
+import pickle
+import random
+import shutil
+import statistics
+import tempfile
+import threading
+import tracemalloc
+import unittest
+import unittest.mock
+
+import simpype
+from simpype.distribution import Categorical, Choice, Empirical, Exponential, Gamma, Uniform
+
+try:
+	import numpy
+except ImportError:
+	numpy = None
+
+
+def mm1(id, resources = 1, engine = 'process', dir = None, seed = 42):
+	""" A simulation where a generator with exponential inter-arrival times feeds resources in series,
+	with exponential service times.
+
+	Args:
+		id (str):
+			The simulation id
+		resources (int):
+			The number of resources, ``res0``, ``res1``, ...
+		engine (str):
+			The simulation engine
+		dir (str):
+			The log directory, ``None`` not to write any log file
+		seed (int):
+			The simulation seed
+
+	Returns:
+		The simulation, the generator ``gen``, and the list of the resources
+
+	"""
+	sim = simpype.Simulation(id = id, engine = engine)
+	if dir is None:
+		sim.log.file = False
+	else:
+		sim.log.dir = dir
+	sim.seed = seed
+	gen = sim.add_generator(id = 'gen')
+	gen.random['arrival'] = {0: Exponential(1.0)}
+	res = []
+	for i in range(resources):
+		res.append(sim.add_resource(id = 'res%d' % i))
+		res[-1].random['service'] = {0: Exponential(1.1)}
+	sim.add_pipeline(gen, *res)
+	return sim, gen, res
+
+
+class TestCase(unittest.TestCase):
+
+	def tempdir(self):
+		""" A temporary directory, removed after the test """
+		path = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, path, True)
+		return path
+
+
+class TestMessage(TestCase):
+
+	def setUp(self):
+		self.sim = simpype.Simulation(id = 'test.message')
+		self.gen = self.sim.add_generator(id = 'gen')
+		self.res = self.sim.add_resource(id = 'res')
+		self.sim.add_pipeline(self.gen, self.res)
+
+	def test_history(self):
+		# The visited history is bounded by Message.history
+		self.gen.message.history = 2
+		message = self.gen.gen_message()
+		for r in [self.res, self.gen, self.res, self.gen]:
+			message.resource = r
+		self.assertEqual(list(message.visited), [self.res, self.gen])
+
+	def test_template(self):
+		# Static properties are shared with the template, the dynamic ones are drawn per message
+		gen = self.gen
+		gen.message.property['priority'] = 'urgent'
+		gen.message.property['size'] = {0: lambda: random.randint(0, 1 << 30)}
+		m1 = gen.gen_message()
+		m2 = gen.gen_message()
+		self.assertIs(m1.property['priority'], m2.property['priority'])
+		self.assertIsNot(m1.property['size'], m2.property['size'])
+		m1.property['priority'] = 'normal'
+		self.assertEqual(gen.message.property['priority'].value, 'urgent')
+		self.assertEqual(m2.property['priority'].value, 'urgent')
+		# Without dynamic properties the whole dictionary is shared until modified
+		del gen.message.property['size']
+		m1 = gen.gen_message()
+		m2 = gen.gen_message()
+		self.assertIs(m1._property, m2._property)
+		self.assertIs(m1.property, m2.property)
+		self.assertEqual(m1.property['priority'].value, 'urgent')
+		self.assertIs(m1._property, m2._property)
+		m1.property['priority'] = 'normal'
+		self.assertIsNot(m1._property, m2._property)
+		self.assertEqual(m1.property['priority'].value, 'normal')
+		self.assertEqual(m2.property['priority'].value, 'urgent')
+		m2.property.update(size = 1, weight = 2)
+		m2.property.setdefault('size', 2)
+		self.assertEqual(sorted(m2.property), ['priority', 'size', 'weight'])
+		self.assertNotIn('size', m1.property)
+		self.assertEqual(gen.gen_message().property['priority'].value, 'urgent')
+
+
+class TestPool(TestCase):
+
+	def test_recycle(self):
+		# Finished messages are recycled by the pool, and reusing a released message is detected in debug mode
+		sim = simpype.Simulation(id = 'test.pool')
+		sim.log.file = False
+		sim.pool.enabled = True
+		sim.pool.debug = True
+		gen = sim.add_generator(id = 'gen')
+		gen.random['arrival'] = {0: lambda: 1.0}
+		res = sim.add_resource(id = 'res')
+		res.random['service'] = {0: lambda: 0.5}
+		sim.add_pipeline(gen, res)
+		released = []
+		@simpype.resource.service(res)
+		def service(self, message):
+			released.append(message)
+			return self.env.timeout(self.random['service'].value)
+		sim.run(until = 100)
+		self.assertTrue(sim.pool.hit > 0 and sim.pool.released > 0)
+		with self.assertRaises(ReferenceError):
+			released[-2].seq_num
+
+
+class TestPipeline(TestCase):
+
+	def test_compile(self):
+		# The pipeline is compiled into shared read-only routes, and its topology is checked
+		sim = simpype.Simulation(id = 'test.pipeline')
+		gen = sim.add_generator(id = 'gen')
+		res = [sim.add_resource(id = 'res%d' % i) for i in range(4)]
+		p = sim.add_pipeline(gen, res[0], res[1])
+		m1 = gen.gen_message()
+		m2 = gen.gen_message()
+		self.assertIs(m1.next, m2.next)
+		self.assertEqual(list(m1.next), ['res0'])
+		p.add_pipe(res[1], res[0])
+		p.add_pipe(res[2], res[3])
+		p.compile()
+		self.assertEqual(p.unreachable, (res[2], res[3]))
+		self.assertEqual(p.cycle, (res[0], res[1]))
+		with self.assertRaises(ValueError):
+			p.compile(strict = True)
+
+
+class TestBuffer(TestCase):
+
+	def test_list(self):
+		# The buffer behaves like a list, and keeps the occupancy of its queue up to date
+		sim = simpype.Simulation(id = 'test.buffer')
+		gen = sim.add_generator(id = 'gen')
+		res = sim.add_resource(id = 'res')
+		sim.add_pipeline(gen, res)
+		queue = res.pipe.queue['default']
+		m = [gen.gen_message() for i in range(6)]
+		buffer = queue.buffer
+		expected = []
+		for b in (buffer, expected):
+			b.extend([m[0], m[1], m[2], m[1]])
+			b.insert(2, m[3])
+			b.insert(-100, m[4])
+			b.insert(100, m[5])
+			b[1] = m[2]
+			b[2:4] = [m[3]]
+			del b[0]
+			del b[-2:]
+			b.reverse()
+			b += [m[0]]
+		self.assertEqual(buffer, expected)
+		self.assertEqual(queue.occupancy, len(expected))
+		self.assertEqual(buffer.count(m[3]), expected.count(m[3]))
+		self.assertEqual(buffer.index(m[0]), expected.index(m[0]))
+		self.assertEqual(buffer.index(m[3], 1), expected.index(m[3], 1))
+		with self.assertRaises(ValueError):
+			buffer.index(m[4])
+		key = lambda message: message.seq_num
+		buffer.sort(key = key)
+		expected.sort(key = key)
+		self.assertEqual(buffer, expected)
+		copy = buffer.copy()
+		copy.clear()
+		self.assertEqual(queue.occupancy, len(buffer))
+		self.assertNotEqual(buffer, copy)
+
+	def test_slice(self):
+		# Messages stored at once in an empty buffer make the queue ready, and are served
+		sim = simpype.Simulation(id = 'test.buffer')
+		sim.log.file = False
+		gen = sim.add_generator(id = 'gen')
+		gen.random['arrival'] = {0: lambda: 1.0}
+		res = sim.add_resource(id = 'res')
+		res.random['service'] = {0: lambda: 0.1}
+		sim.add_pipeline(gen, res)
+		held = []
+		@simpype.queue.push(res.pipe.queue['default'])
+		def push(self, message):
+			held.append(message)
+			if len(held) == 2:
+				self.buffer[:] = held
+				held.clear()
+			return message
+		served = []
+		@simpype.resource.service(res)
+		def service(self, message):
+			served.append(message.seq_num)
+			return self.env.timeout(self.random['service'].value)
+		sim.run(until = 10.5)
+		self.assertEqual(served, list(range(10)))
+
+
+class TestQueue(TestCase):
+
+	MODEL = """
+import simpype
+
+
+class Held(simpype.Queue):
+	def __init__(self, sim, pipe, id):
+		super().__init__(sim, pipe, id)
+		self.held = []
+
+	@simpype.queue.push
+	def push(self, message):
+		self.held.append(message)
+		return message
+
+	@simpype.queue.pop
+	def pop(self):
+		return self.held.pop(0) if self.held else None
+
+	def __len__(self):
+		return len(self.held)
+
+
+queue = lambda *args: Held(*args)
+"""
+
+	def test_len(self):
+		# The messages of a queue overloading __len__ and storing them outside of its buffer are served
+		dir = self.tempdir()
+		with open(os.path.join(dir, 'held.py'), 'w') as f:
+			f.write(self.MODEL)
+		for engine in ('process', 'callback'):
+			sim = simpype.Simulation(id = 'test.queue', engine = engine)
+			sim.log.file = False
+			sim.model.dir = dir
+			gen = sim.add_generator(id = 'gen')
+			gen.random['arrival'] = {0: lambda: 1.0}
+			res = sim.add_resource(id = 'res')
+			res.random['service'] = {0: lambda: 0.1}
+			res.pipe.add_queue(id = 'held', model = 'held')
+			sim.add_pipeline(gen, res)
+			@simpype.pipe.enqueue(res.pipe)
+			def enqueue(self, message):
+				return self.queue['held'].push(message)
+			@simpype.pipe.dequeue(res.pipe)
+			def dequeue(self):
+				return self.queue['held'].pop()
+			served = []
+			@simpype.resource.service(res)
+			def service(self, message):
+				served.append(message.seq_num)
+				return self.env.timeout(self.random['service'].value)
+			sim.run(until = 10.5)
+			self.assertEqual(served, list(range(10)), engine)
+
+
+class TestEngine(TestCase):
+
+	def test_same_events(self):
+		# Both engines log the same events at the same times, the events sharing a timestamp in any order
+		logs = {}
+		for engine in ('process', 'callback'):
+			sim, gen, res = mm1('test.engine', resources = 3, engine = engine, dir = self.tempdir())
+			# Deterministic times, so that many events share a timestamp
+			gen.random['arrival'] = {0: lambda: 1.0}
+			for r in res:
+				r.random['service'] = {0: lambda: 1.0}
+			@simpype.resource.service(res[1])
+			def service(self, message):
+				yield self.env.timeout(self.random['service'].value)
+			sim.run(until = 50)
+			with open(os.path.join(sim.log.dir, 'sim.log')) as f:
+				logs[engine] = f.readlines()[1:]
+			timestamps = [float(l.split(',')[0]) for l in logs[engine]]
+			self.assertEqual(timestamps, sorted(timestamps))
+		self.assertEqual(collections.Counter(logs['process']), collections.Counter(logs['callback']))
+
+
+class TestResource(TestCase):
+
+	def test_shared_event(self):
+		# Dropping a message served by an event shared with another message leaves the other one in service
+		for engine in ('process', 'callback'):
+			sim = simpype.Simulation(id = 'test.resource', engine = engine)
+			sim.log.dir = self.tempdir()
+			gen = sim.add_generator(id = 'gen')
+			gen.random['arrival'] = {0: lambda: 0.5, 0.75: lambda: None}
+			res = sim.add_resource(id = 'res', capacity = 2)
+			sim.add_pipeline(gen, res)
+			shared = sim.env.timeout(10)
+			@simpype.resource.service(res)
+			def service(self, message):
+				if message.seq_num == 0:
+					message.drop('expired', self.env.timeout(3, 'expired'))
+				return shared
+			sim.run(until = 20)
+			with open(os.path.join(sim.log.dir, 'sim.log')) as f:
+				served = [l.strip().split(',') for l in f if 'resource.' in l]
+			self.assertEqual(served, [
+				['3.500000000', 'gen', '0', 'res', 'resource.expired'],
+				['10.000000000', 'gen', '1', 'res', 'resource.serve'],
+			], engine)
+
+	def test_task_alive(self):
+		# A task is alive until it completes or is interrupted, whatever the engine
+		for engine in ('process', 'callback'):
+			sim = simpype.Simulation(id = 'test.resource', engine = engine)
+			sim.log.file = False
+			gen = sim.add_generator(id = 'gen')
+			gen.random['arrival'] = {0: lambda: 1.0, 2.5: lambda: None}
+			res = sim.add_resource(id = 'res', capacity = 2)
+			sim.add_pipeline(gen, res)
+			@simpype.resource.service(res)
+			def service(self, message):
+				return self.env.timeout(3)
+			alive = []
+			def check():
+				yield sim.env.timeout(2.5)
+				tasks = list(res.task.values())
+				alive.append([t.is_alive for t in tasks])
+				tasks[0].interrupt('preempted')
+				alive.append([t.is_alive for t in tasks])
+				yield sim.env.timeout(3)
+				alive.append([t.is_alive for t in tasks])
+			sim.env.process(check())
+			sim.run(until = 10)
+			self.assertEqual(alive, [[True, True], [False, True], [False, False]], engine)
+
+
+class TestTimer(TestCase):
+
+	def test_lifetime(self):
+		# Lifetimes share the simulation timer and are cancelled when the messages are done
+		sim = simpype.Simulation(id = 'test.timer')
+		sim.log.file = False
+		gen = sim.add_generator(id = 'gen')
+		gen.random['arrival'] = {0: lambda: 1.0}
+		gen.message.property['lifetime'] = {0: lambda: 1000.0}
+		res = sim.add_resource(id = 'res')
+		res.random['service'] = {0: lambda: 0.5}
+		sim.add_pipeline(gen, res)
+		@simpype.resource.service(res)
+		def service(self, message):
+			message.unsubscribe('lifetime')
+			return self.env.timeout(self.random['service'].value)
+		sim.run(until = 10000)
+		self.assertLessEqual(len(sim.timer), 1)
+		self.assertLess(len(sim.env._queue), 10)
+
+
+class TestSubscription(TestCase):
+
+	def test_callback(self):
+		# Callback subscriptions attach to the event without any process, and are cancelled by a flag
+		sim = simpype.Simulation(id = 'test.subscription')
+		gen = sim.add_generator(id = 'gen')
+		message = gen.gen_message()
+		called = []
+		e = sim.env.event()
+		pending = len(sim.env._queue)
+		message.subscribe(event = e, callback = lambda m, v: called.append(v), id = 'a', mode = 'callback')
+		message.subscribe(event = e, callback = lambda m, v: called.append(v), id = 'b', mode = 'callback')
+		message.unsubscribe('b')
+		self.assertEqual(len(sim.env._queue), pending)
+		self.assertEqual(list(message.subscription), ['a'])
+		copy = message.copy()
+		e.succeed('tick')
+		sim.env.run(until = 1)
+		self.assertEqual(called, ['tick', 'tick'])
+		self.assertFalse(message.subscription or copy.subscription)
+
+
+class TestRandom(TestCase):
+
+	def test_steps(self):
+		# Random steps are compiled without calling the lambdas and are never consumed
+		sim = simpype.Simulation(id = 'test.random')
+		calls = []
+		r = simpype.Random(sim, {
+			10: lambda: calls.append(10) or 3.0,
+			20: lambda: None,
+			30: lambda: 1.0,
+		})
+		self.assertEqual(calls, [])
+		self.assertEqual([r.at(t) for t in (25.0, 15.0, 4.0, 35.0, 12.0)], [6.0, 3.0, 9.0, 1.0, 3.0])
+		self.assertEqual(r.value, 13.0)
+
+	def test_distribution(self):
+		# Distributions hand out pre-sampled values
+		d = Exponential(0.5)
+		N = 200000
+		self.assertLess(abs(sum(d() for i in range(N)) / N - 2.0), 0.05)
+		sim = simpype.Simulation(id = 'test.random')
+		r = simpype.Random(sim, {0: Uniform(1.0, 2.0), 10: lambda: None, 20: Exponential(1.0)})
+		self.assertTrue(1.0 <= r.at(5.0) <= 2.0)
+		self.assertGreater(r.at(15.0), 5.0)
+
+
+class TestStream(TestCase):
+
+	def draws(self, n):
+		sim = simpype.Simulation(id = 'test.stream')
+		sim.seed = 7
+		for i in range(n):
+			sim.add_resource(id = 'other%d' % i).random['service'] = {0: lambda rng: rng.random()}
+		res = sim.add_resource(id = 'res')
+		res.random['service'] = {0: lambda rng: rng.random(), 10: Exponential(1.0)}
+		gen = sim.add_generator(id = 'gen')
+		gen.message.property['size'] = {0: lambda rng: rng.randint(0, 1 << 30)}
+		return [res.random['service'].at(0.0) for i in range(3)] + [res.random['service'].at(10.0)], gen.message.property['size'].value
+
+	def test_independent(self):
+		# Streams only depend on the seed and on the component, not on the other components
+		self.assertEqual(self.draws(0), self.draws(5))
+
+	def test_seed(self):
+		sim = simpype.Simulation(id = 'test.stream')
+		sim.seed = 7
+		a = sim.stream('a').random.random()
+		sim.seed = 7
+		self.assertEqual(sim.stream('a').random.random(), a)
+		self.assertNotEqual(sim.stream('b').random.random(), a)
+
+
+class TestDistribution(TestCase):
+
+	def test_pickle(self):
+		# Distributions are picklable, expose their moments and replace whole step dictionaries
+		d = pickle.loads(pickle.dumps(Choice([1, 5, 10], [1, 2, 7])))
+		self.assertAlmostEqual(d.mean, 8.1)
+		self.assertLess(abs(sum(d.sample(100000)) / 100000 - d.mean), 0.1)
+		d = pickle.loads(pickle.dumps(Empirical(samples = [2.0, 4.0, 9.0])))
+		self.assertEqual((d.mean, d.variance), (5.0, 26.0 / 3.0))
+		self.assertTrue(set(d.sample(100)) <= {2.0, 4.0, 9.0})
+		sim = simpype.Simulation(id = 'test.distribution')
+		res = sim.add_resource(id = 'res')
+		res.random['service'] = Exponential(2.0)
+		self.assertEqual(res.random['service'].distribution(0.0).mean, 0.5)
+		self.assertGreater(res.random['service'].value, 0)
+		gen = sim.add_generator(id = 'gen')
+		gen.message.property['fish'] = Choice(['cod', 'tuna', 'calamari'])
+		self.assertIn(gen.message.property['fish'].value, ('cod', 'tuna', 'calamari'))
+		self.assertEqual(pickle.loads(pickle.dumps(res.random['service'].distribution(0.0))).rate, 2.0)
+
+	def test_categorical(self):
+		# Categorical draws through the alias table and hands out the interned categories
+		skus = ['sku%d' % i for i in range(500)]
+		weights = [i % 7 + 1 for i in range(500)]
+		c = Categorical(skus, weights)
+		N = 200000
+		count = collections.Counter(c.sample(N))
+		self.assertLess(max(abs(count[s] / N - w / sum(weights)) for s, w in zip(skus, weights)), 0.002)
+		self.assertTrue(all(v is skus[c.index[v]] for v in count))
+
+
+class TestGenerator(TestCase):
+
+	def test_nhpp(self):
+		# A non-homogeneous Poisson generator follows the rate, i.e. each hour has the arrivals of the integral of the rate
+		sim = simpype.Simulation(id = 'test.nhpp')
+		sim.seed = 3
+		gen = sim.add_generator(id = 'gen', model = 'nhpp')
+		rate = [1.0 + math.sin(math.pi * i / 288) for i in range(288)]
+		gen.rate = {300 * i: r for i, r in enumerate(rate)}
+		times = []
+		gen.send = lambda message: times.append(sim.env.now)
+		sim.env.run(until = 86400)
+		self.assertEqual(times, sorted(times))
+		# The rate is constant after the last breakpoint
+		steps = [300 * (r0 + r1) / 2 for r0, r1 in zip(rate, rate[1:])] + [300 * rate[-1]]
+		hours = collections.Counter(int(t // 3600) for t in times)
+		for h in range(24):
+			expected = sum(steps[12 * h:12 * (h + 1)])
+			self.assertLess(abs(hours[h] - expected), 5 * math.sqrt(expected), h)
+
+	def replay(self, path, converters):
+		sim = simpype.Simulation(id = 'test.trace')
+		gen = sim.add_generator(id = 'gen', model = 'trace')
+		gen.trace = path
+		gen.converters = converters
+		gen.block = 64
+		replayed = []
+		gen.send = lambda message: replayed.append((sim.env.now, message.property['size'].value))
+		sim.env.run()
+		self.assertEqual(replayed, [(i * 0.5, i % 7) for i in range(1000)])
+
+	def test_trace_csv(self):
+		# A trace generator replays the rows of a CSV file, one message per row
+		path = os.path.join(self.tempdir(), 'trace.csv')
+		with open(path, 'w') as f:
+			f.write('time,size\n' + ''.join('%s,%d\n' % (i * 0.5, i % 7) for i in range(1000)))
+		self.replay(path, {'size': int})
+		# The file is only open while the rows are read
+		opened = []
+		def tracked(*args, **kwargs):
+			opened.append(open(*args, **kwargs))
+			return opened[-1]
+		gen = simpype.Simulation(id = 'test.trace').add_generator(id = 'gen', model = 'trace')
+		gen.trace = path
+		with unittest.mock.patch('simpype.model.trace.open', tracked, create = True):
+			names, rows = gen._rows()
+			self.assertTrue(all(f.closed for f in opened))
+			self.assertEqual(next(rows), [0.0, '0'])
+			self.assertFalse(opened[-1].closed)
+			rows.close()
+			gen.time = 'arrival'
+			self.assertRaises(AssertionError, gen._rows)
+		self.assertTrue(all(f.closed for f in opened))
+
+	@unittest.skipIf(numpy is None, "NumPy is not installed")
+	def test_trace_npy(self):
+		# Or of memory-mapped columns
+		trace = self.tempdir()
+		numpy.save(os.path.join(trace, 'time.npy'), numpy.arange(1000) * 0.5)
+		numpy.save(os.path.join(trace, 'size.npy'), numpy.arange(1000) % 7)
+		self.replay(trace, {})
+
+	def test_superposition(self):
+		# A superposition generator serves any number of sources with one process and one pending event
+		sim = simpype.Simulation(id = 'test.superposition')
+		gen = sim.add_generator(id = 'gen', model = 'superposition')
+		arrival = Exponential(1.0 / 100.0, block = 64)
+		for i in range(10000):
+			gen.add_source('customer%d' % i, arrival)
+		# Each source samples its own copy of the distribution
+		self.assertIsNone(arrival.stream)
+		self.assertIsNot(gen.source['customer0'].distribution(0), gen.source['customer1'].distribution(0))
+		sources = collections.Counter()
+		queue = []
+		def send_batch(messages):
+			sources.update(message.property['source'].value for message in messages)
+			queue.append(len(sim.env._queue))
+		gen.send_batch = send_batch
+		sim.env.run(until = 1000)
+		self.assertLess(abs(sum(sources.values()) - 100000), 5 * math.sqrt(100000))
+		self.assertGreater(len(sources), 9900)
+		self.assertLessEqual(max(queue), 2)
+
+	def test_batch(self):
+		# Batch arrivals are generated from the template at once and enqueued in bulk
+		for engine in ('process', 'callback'):
+			sim = simpype.Simulation(id = 'test.batch', engine = engine)
+			sim.log.file = False
+			gen = sim.add_generator(id = 'gen')
+			gen.random['arrival'] = {0: lambda: 0.5, 0.75: lambda: None}
+			gen.random['quantity'] = {0: lambda: 500}
+			gen.message.property['weight'] = Uniform(5.0, 25.0)
+			res = sim.add_resource(id = 'res')
+			res.random['service'] = {0: lambda: 10.0}
+			sim.add_pipeline(gen, res)
+			full = []
+			res.pipe.full = (lambda full_: lambda: full.append(1) or full_())(res.pipe.full)
+			sim.run(until = 1.0)
+			# Once for the batch, once after dequeueing the message in service
+			self.assertEqual(len(full), 2)
+			self.assertEqual(res.pipe.occupancy, 499)
+			buffer = res.pipe.queue['default'].buffer
+			self.assertTrue(all(5.0 <= m.property['weight'].value <= 25.0 for m in buffer))
+			self.assertEqual([m.seq_num for m in buffer], list(range(1, 500)))
+
+
+class TestVarianceReduction(TestCase):
+
+	def waiting(self, seed, id, rate, common = True):
+		""" The mean waiting time of the first customers """
+		sim, gen, res = mm1('test.crn', seed = seed)
+		# Logical streams, shared by the scenarios
+		gen.random['arrival'] = simpype.Random(sim, Exponential(1.0), 'arrival' if common else id + '.arrival')
+		res[0].random['service'] = simpype.Random(sim, Exponential(rate), 'service' if common else id + '.service')
+		delays = []
+		@simpype.resource.service(res[0])
+		def service(self, message):
+			delays.append(self.env.now - message.generated)
+			yield self.env.timeout(self.random['service'].value)
+		sim.run(until = 300)
+		# The waiting times of the first customers are monotone in the random numbers
+		return statistics.mean(delays[:200])
+
+	def test_crn(self):
+		# Common random numbers reduce the variance of the difference between two scenarios
+		crn = [self.waiting(s, 'a', 2.0) - self.waiting(s, 'b', 2.2) for s in range(30)]
+		independent = [self.waiting(s, 'a', 2.0, False) - self.waiting(s, 'b', 2.2, False) for s in range(30)]
+		self.assertLess(statistics.variance(crn), statistics.variance(independent) / 3)
+
+	def means(self, seed, antithetic = False):
+		sim = simpype.Simulation(id = 'test.antithetic')
+		sim.seed = seed
+		sim.antithetic = antithetic
+		res = sim.add_resource(id = 'res')
+		res.random['service'] = {0: Exponential(2.0), 10: lambda rng: rng.uniform(0.0, 1.0)}
+		return [statistics.mean(res.random['service'].at(t) for i in range(100)) for t in (0.0, 10.0)]
+
+	def test_antithetic(self):
+		# Antithetic variates reduce the variance of the mean of a pair of runs
+		single = [self.means(s) for s in range(40)]
+		pairs = [self.means(s) for s in range(20)], [self.means(s, True) for s in range(20)]
+		for i in range(2):
+			mean = [(a[i] + b[i]) / 2 for a, b in zip(*pairs)]
+			self.assertLess(statistics.variance(mean), statistics.variance([s[i] for s in single]) / 4)
+
+	def test_unsupported(self):
+		# Gamma and Categorical reject antithetic streams alike, with and without NumPy
+		for module in ([numpy, None] if numpy is not None else [None]):
+			with unittest.mock.patch('simpype.distribution.numpy', module):
+				for distribution in (Gamma(2.0, 1.0), Categorical(['a', 'b'], [1, 3])):
+					sim = simpype.Simulation(id = 'test.antithetic')
+					sim.antithetic = True
+					res = sim.add_resource(id = 'res')
+					with self.assertRaises(ValueError):
+						res.random['service'] = {0: distribution}
+					# Also when the simulation turns antithetic after binding the distribution
+					sim.antithetic = False
+					res.random['service'] = {0: distribution}
+					sim.antithetic = True
+					with self.assertRaises(ValueError):
+						res.random['service'].value
+
+
+class TestLog(TestCase):
+
+	def read(self, sim, name = 'sim.log'):
+		with open(os.path.join(sim.log.dir, name)) as f:
+			return f.read()
+
+	def logged(self, format = 'csv', chunk = 65536, thread = False):
+		""" The CSV log of a simulation logging three properties, one of them missing, converted from the binary log if any """
+		sim, gen, res = mm1('test.log', dir = self.tempdir())
+		sim.log.format = format
+		sim.log.thread = thread
+		sim.log.chunk = chunk
+		sim.log.property('size')
+		sim.log.property('weight')
+		sim.log.property('color')
+		gen.message.property['size'] = {0: lambda rng: rng.choice(['small', 'large']), 500: lambda: 1500}
+		gen.message.property['weight'] = Uniform(5.0, 25.0)
+		sim.run(until = 1000)
+		if format == 'binary':
+			simpype.log.to_csv(os.path.join(sim.log.dir, 'sim.bin'), os.path.join(sim.log.dir, 'sim.log'))
+		return self.read(sim)
+
+	def test_binary(self):
+		# The binary log converts back to the CSV log, also across several chunks
+		csv = self.logged()
+		self.assertIn(",NA\n", csv)
+		self.assertEqual(self.logged('binary'), csv)
+		self.assertEqual(self.logged('binary', 100), csv)
+
+	def test_thread(self):
+		# The log files are written by a background thread, flushed and stopped at the end of each run
+		csv = self.logged()
+		for format in ('csv', 'binary'):
+			self.assertEqual(self.logged(format, 100, True), csv)
+			self.assertFalse(any(t.name == 'simpype.log' for t in threading.enumerate()))
+
+	def test_close(self):
+		# The log file is complete and closed when each run returns, the following runs being appended
+		csv = self.logged()
+		for format, thread in itertools.product(('csv', 'binary'), (False, True)):
+			sim, gen, res = mm1('test.log', dir = self.tempdir())
+			sim.log.format = format
+			sim.log.thread = thread
+			sim.log.property('size')
+			sim.log.property('weight')
+			sim.log.property('color')
+			gen.message.property['size'] = {0: lambda rng: rng.choice(['small', 'large']), 500: lambda: 1500}
+			gen.message.property['weight'] = Uniform(5.0, 25.0)
+			for until in (500, 1000):
+				sim.run(until = until)
+				if format == 'binary':
+					self.assertTrue(sim.log._writer._file.closed)
+				else:
+					self.assertTrue(all(h.stream is None for h in sim.log._log.handlers))
+			if format == 'binary':
+				simpype.log.to_csv(os.path.join(sim.log.dir, 'sim.bin'), os.path.join(sim.log.dir, 'sim.log'))
+			self.assertEqual(self.read(sim), csv)
+
+	def test_sync(self):
+		# The log file is synced to the disk only if requested
+		for format, thread, sync in itertools.product(('csv', 'binary'), (False, True), (False, True)):
+			sim, gen, res = mm1('test.log', dir = self.tempdir())
+			sim.log.format = format
+			sim.log.thread = thread
+			sim.log.sync = sync
+			with unittest.mock.patch('os.fsync') as fsync:
+				sim.run(until = 100)
+			self.assertEqual(fsync.called, sync)
+
+	def test_error(self):
+		# The entries logged before an error are written, and the thread is stopped
+		for thread in (False, True):
+			sim, gen, res = mm1('test.log', dir = self.tempdir())
+			sim.log.format = 'binary'
+			sim.log.thread = thread
+			@simpype.resource.service(res[0])
+			def service(self, message):
+				if self.env.now > 100:
+					raise RuntimeError
+				return self.env.timeout(self.random['service'].value)
+			with self.assertRaises(RuntimeError):
+				sim.run(until = 1000)
+			self.assertTrue(sim.log._writer._file.closed)
+			self.assertFalse(any(t.name == 'simpype.log' for t in threading.enumerate()))
+			properties, chunks = simpype.log.read(os.path.join(sim.log.dir, 'sim.bin'))
+			timestamps = [t for strings, fixed, property in chunks for t in fixed[0]]
+			self.assertGreater(timestamps[-1], 100)
+
+	def test_worker_error(self):
+		# The errors of the thread are raised in the simulation
+		worker = simpype.log.Worker(1)
+		worker.put(lambda: 1 / 0)
+		with self.assertRaises(ZeroDivisionError):
+			worker.close()
+
+	def test_intern(self):
+		# The interned log carries integer codes, listed in sim.cfg
+		sim, gen, res = mm1('test.intern', dir = self.tempdir())
+		sim.run(until = 500)
+		plain = self.read(sim)
+		sim, gen, res = mm1('test.intern', dir = self.tempdir())
+		sim.log.intern = True
+		sim.run(until = 500)
+		codes = dict(l[len("Log Code "):].split(": ", 1) for l in self.read(sim, 'sim.cfg').splitlines() if l.startswith("Log Code "))
+		self.assertEqual({codes['0'], codes['1'], codes['2']}, {'pipe.in', 'pipe.out', 'resource.serve'})
+		self.assertEqual((codes['3'], codes['4']), ('gen', 'res0'))
+		decoded = []
+		for line in self.read(sim).splitlines()[1:]:
+			t, m, n, r, e = line.split(",")
+			decoded.append(",".join([t, codes[m], n, codes[r], codes[e]]))
+		self.assertEqual(decoded, plain.splitlines()[1:])
+
+	def filtered(self, **kwargs):
+		""" The log entries of a simulation filtered by ``kwargs``, and the number of timestamps created """
+		sim, gen, res = mm1('test.filter', 2, dir = self.tempdir())
+		for key, val in kwargs.items():
+			if key == 'sample':
+				sim.log.sample = val
+			else:
+				getattr(sim.log, key)(**val)
+		created = []
+		init = simpype.message.Timestamp.__init__
+		simpype.message.Timestamp.__init__ = lambda self, *args: created.append(1) or init(self, *args)
+		try:
+			sim.run(until = 2000)
+		finally:
+			simpype.message.Timestamp.__init__ = init
+		return [l.split(",") for l in self.read(sim).splitlines()[1:]], len(created)
+
+	def test_filter(self):
+		# The log entries are filtered before creating their timestamps
+		everything, n = self.filtered()
+		self.assertEqual(n, len(everything))
+		rows, n = self.filtered(include = {'resource': 'res1', 'event': ['resource.serve']})
+		self.assertEqual(n, len(rows))
+		self.assertEqual(rows, [r for r in everything if r[3] == 'res1' and r[4] == 'resource.serve'])
+		rows, n = self.filtered(exclude = {'event': 'pipe.in'})
+		self.assertEqual(n, len(rows))
+		self.assertEqual(rows, [r for r in everything if r[4] != 'pipe.in'])
+
+	def test_sample(self):
+		# The messages are sampled by sequence number, keeping their whole traces
+		everything, n = self.filtered()
+		rows, n = self.filtered(sample = 0.1)
+		sampled = {r[2] for r in rows}
+		self.assertEqual(rows, [r for r in everything if r[2] in sampled])
+		self.assertTrue(0.05 < len(sampled) / len({r[2] for r in everything}) < 0.15)
+
+	def test_sample_generators(self):
+		# The generators numbering their messages alike are sampled independently
+		sim = simpype.Simulation(id = 'test.sample')
+		sim.log.file = False
+		sim.log.sample = 0.3
+		sampled = []
+		for id in ('gen0', 'gen1'):
+			message = sim.add_generator(id = id).gen_message()
+			sampled.append(set())
+			for i in range(4000):
+				message.seq_num = i
+				if sim.log._filter(message, 'pipe.in'):
+					sampled[-1].add(i)
+		for s in sampled:
+			self.assertTrue(0.25 < len(s) / 4000 < 0.35)
+		self.assertTrue(0.2 < len(sampled[0] & sampled[1]) / len(sampled[0]) < 0.4)
+
+	def test_disabled(self):
+		# Without logging, tracing an event allocates nothing
+		sim = simpype.Simulation(id = 'test.trace')
+		sim.log.file = False
+		gen = sim.add_generator(id = 'gen')
+		message = gen.gen_message()
+		message.timestamp('warmup')
+		tracemalloc.start()
+		before = tracemalloc.take_snapshot()
+		for i in range(10000):
+			message.timestamp('pipe.in')
+		after = tracemalloc.take_snapshot()
+		tracemalloc.stop()
+		self.assertEqual(sum(s.size_diff for s in after.compare_to(before, 'filename') if s.traceback[0].filename == simpype.message.__file__), 0)
+
+	def test_properties(self):
+		# The logged properties are formatted without setting the missing ones
+		sim = simpype.Simulation(id = 'test.property')
+		sim.log.dir = self.tempdir()
+		sim.log.property('size')
+		sim.log.property('color')
+		sim.log.init()
+		gen = sim.add_generator(id = 'gen')
+		message = gen.gen_message()
+		message.property['size'] = 3
+		message.timestamp('pipe.in')
+		self.assertNotIn('color', message.property)
+		self.assertEqual(sim.log._row(simpype.message.Timestamp(message, 0.0, gen, 'pipe.in'))[-1], ",3,NA")
+
+
+if __name__ == '__main__':
+	unittest.main()